@@ -0,0 +1,178 @@
+"""
+ReAct agent 前面的语义答案缓存: 新消息与缓存的问题向量相似度超过阈值时, 直接回放上次发给前端的回答和工具结果,
+不再跑一遍 Coze 多轮调用。
+    - 每条答案有 TTL, 超过 max_entries 时淘汰最早的
+    - 问题里有时效性的词(今天、实时、传感器...)时不查也不存
+    - 回答过程中调用过时效性工具(传感器 API、当前时间)的答案不存
+    - 只查能脱离上下文理解的消息(够长、不是"为什么？""还有呢"这类接着上文的追问); 只存会话第一轮的回答, 不带前文
+    - 命中的轮次没经过 agent, Coze 会话里没有记录, 用 with_replayed 在下一次调用 agent 时补上
+    - stats() 给出查询数、命中数、绕过数和命中率
+"""
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+
+from .query_cache import TTLCache, normalize_query
+
+SIMILARITY_THRESHOLD = 0.92
+ANSWER_TTL = 24 * 3600
+# 结果依赖调用时刻的工具, 用过这些工具的回答不缓存
+BYPASS_TOOLS = frozenset({"execute_api_call", "get_now_local_datetime"})
+BYPASS_PATTERN = re.compile(r"今天|今日|明天|昨天|现在|当前|目前|实时|最新|最近|传感器|灌溉记录|天气|\d{4}[-年]\d{1,2}")
+# 短消息和承接上文的追问要结合前文才有意义, 不同会话之间不能互相回放
+MIN_QUESTION_CHARS = 5
+FOLLOW_UP_PATTERN = re.compile(
+    # 明确指向前文的说法, 以及用来接话的开头("那怎么办""还有呢""详细说说")
+    r"刚才|上一个|上一条|你说的|^(继续|接着|另外|再|详细|具体|展开|还有|然后)"
+    r"|^那(?![个些种])|^呢|呢[？?。！!]*$"
+    r"|^(为什么|为啥|怎么回事|怎么说)[？?。！!]*$"
+    # 代词本身就是主语; "这个品种""那些品种"自带主语, 不算追问
+    r"|(?<!其)它|这样|那样|这么做|那么做"
+    r"|[这那][个些种](?=$|[，,？?。！!呢吗啊]|怎么|是|有|能|会|要|可以|适合|好|对|不)"
+)
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    # 当时发给前端的消息(0: 回答增量已合并, a: 工具结果, d: 结束), 命中时按顺序重发
+    frames: list[str]
+    answer: str
+    expires_at: float
+    hits: int = field(default=0)
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        threshold: float = SIMILARITY_THRESHOLD,
+        ttl: float = ANSWER_TTL,
+        max_entries: int = 2048,
+        bypass_tools: frozenset[str] = BYPASS_TOOLS,
+        bypass_pattern: re.Pattern | None = BYPASS_PATTERN,
+    ):
+        self.embed_model = embed_model
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.bypass_tools = bypass_tools
+        self.bypass_pattern = bypass_pattern
+        self._lock = threading.Lock()
+        self._answers: list[CachedAnswer] = []
+        self._vectors = np.empty((0, 0), dtype=np.float32)
+        # lookup 时算出的问题向量, store 时复用
+        self._embeddings = TTLCache(max_entries=256, ttl=600)
+        self._stats = {"lookups": 0, "hits": 0, "bypassed": 0, "stores": 0, "skipped_stores": 0}
+
+    def bypass(self, question: str) -> bool:
+        if self.bypass_pattern is not None and self.bypass_pattern.search(question) is not None:
+            return True
+        return not is_standalone(question)
+
+    async def _embed(self, question: str) -> np.ndarray:
+        key = normalize_query(question)
+        vector = self._embeddings.get(key)
+        if vector is None:
+            vector = np.asarray(await self.embed_model.aget_query_embedding(question), dtype=np.float32)
+            vector /= max(float(np.linalg.norm(vector)), 1e-12)
+            self._embeddings.put(key, vector)
+        return vector
+
+    def _evict_expired(self, now: float):
+        keep = [i for i, a in enumerate(self._answers) if a.expires_at > now]
+        if len(keep) != len(self._answers):
+            self._answers = [self._answers[i] for i in keep]
+            self._vectors = self._vectors[keep]
+
+    async def lookup(self, question: str) -> CachedAnswer | None:
+        with self._lock:
+            self._stats["lookups"] += 1
+            if self.bypass(question):
+                self._stats["bypassed"] += 1
+                return None
+            if not self._answers:
+                return None
+        try:
+            vector = await self._embed(question)
+        except Exception as e:
+            # 缓存不可用时照常走 agent
+            print(f"⚠️ answer cache lookup failed: {e}")
+            return None
+        with self._lock:
+            self._evict_expired(time.time())
+            if not self._answers:
+                return None
+            scores = self._vectors @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            answer = self._answers[best]
+            answer.hits += 1
+            self._stats["hits"] += 1
+            return answer
+
+    async def store(self, question: str, frames: list[str], result: dict, turn: int = 0):
+        """result 为 ReActAgent 的 StopEvent 结果, turn 为这条消息之前会话里已有的轮数"""
+        used_tools = {source.tool_name for group in result.get("sources", []) for source in group}
+        # 后面轮次的回答可能用到了前文, 换个会话回放就不对了
+        if turn > 0 or self.bypass(question) or used_tools & self.bypass_tools:
+            with self._lock:
+                self._stats["skipped_stores"] += 1
+            return
+        try:
+            vector = await self._embed(question)
+        except Exception as e:
+            print(f"⚠️ answer cache store failed: {e}")
+            return
+        answer = CachedAnswer(question, coalesce_frames(frames), result.get("response", ""), time.time() + self.ttl)
+        with self._lock:
+            self._evict_expired(time.time())
+            vectors = self._vectors if len(self._answers) else np.empty((0, len(vector)), dtype=np.float32)
+            self._answers.append(answer)
+            self._vectors = np.vstack([vectors, vector[None, :]])
+            if len(self._answers) > self.max_entries:
+                self._answers = self._answers[-self.max_entries:]
+                self._vectors = self._vectors[-self.max_entries:]
+            self._stats["stores"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["lookups"]
+            return {
+                **self._stats,
+                "entries": len(self._answers),
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+            }
+
+
+def coalesce_frames(frames: list[str]) -> list[str]:
+    """把相邻的 0: 回答增量合并成一条, 前端按增量拼接, 效果相同"""
+    res: list[str] = []
+    for frame in frames:
+        if frame.startswith("0:") and res and res[-1].startswith("0:"):
+            res[-1] += frame[2:]
+        else:
+            res.append(frame)
+    return res
+
+
+def is_standalone(question: str) -> bool:
+    question = question.strip()
+    return len(question) >= MIN_QUESTION_CHARS and FOLLOW_UP_PATTERN.search(question) is None
+
+
+def answer_text(frames: list[str]) -> str:
+    return "".join(frame[2:] for frame in frames if frame.startswith("0:"))
+
+
+def with_replayed(question: str, replayed: list[tuple[str, CachedAnswer]]) -> str:
+    """把缓存直接回放的轮次拼到这次的输入前面, 让 agent 和 Coze 会话知道前文"""
+    if not replayed:
+        return question
+    history = "\n".join(f"用户: {q}\n助手: {answer_text(a.frames)}" for q, a in replayed)
+    return f"之前的对话:\n{history}\n\n用户: {question}"
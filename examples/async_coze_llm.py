@@ -1,7 +1,20 @@
+import asyncio
 import logging
 import os
+from collections import deque
 
-from cozepy import COZE_CN_BASE_URL, AsyncCoze, AsyncTokenAuth, ChatEventType, ChatStatus, Message, MessageType
+import httpx
+from cozepy import (
+    COZE_CN_BASE_URL,
+    AsyncCoze,
+    AsyncHTTPClient,
+    AsyncTokenAuth,
+    ChatEventType,
+    ChatStatus,
+    Conversation,
+    Message,
+    MessageType,
+)
 from dotenv import load_dotenv
 
 logger = logging.getLogger(__name__)
@@ -12,9 +25,77 @@ load_dotenv()  # take environment variables from .env.
 COZE_API_TOKEN = os.getenv("COZE_API_TOKEN")
 BOT_ID = os.getenv("BOT_ID")
 USER_ID = "user id"
+# 所有 CozeLLM 共用一个客户端, 连接池的上限; 空闲连接保持一段时间, 下一轮 ReAct 请求不用重新握手
+MAX_CONNECTIONS = 64
+MAX_KEEPALIVE_CONNECTIONS = 16
+KEEPALIVE_EXPIRY = 60
+# 预先创建好的会话数, 大致是同时新建连接的用户数
+CONVERSATION_POOL_SIZE = 4
 
 # Initialize Coze client
-acoze = AsyncCoze(auth=AsyncTokenAuth(token=COZE_API_TOKEN), base_url=COZE_CN_BASE_URL)
+acoze = AsyncCoze(
+    auth=AsyncTokenAuth(token=COZE_API_TOKEN),
+    base_url=COZE_CN_BASE_URL,
+    http_client=AsyncHTTPClient(
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+    ),
+)
+
+
+class ConversationPool:
+    """
+    预先创建好的 Coze 会话, 新的 session 直接取走一个, 不用等创建会话的请求, 取走后在后台补上。
+    会话里有对话历史, 每个会话只交给一个 session, 用完不回收, 不同用户的对话不会混在一起。
+    """
+
+    def __init__(self, client: AsyncCoze = acoze, size: int = CONVERSATION_POOL_SIZE):
+        self.client = client
+        self.size = size
+        self._ready: deque[Conversation] = deque()
+        self._refill_task: asyncio.Task | None = None
+        self.hits = 0
+        self.misses = 0
+
+    async def fill(self):
+        """并发创建会话, 补足到 size 个; 创建失败只记日志, 之后 acquire 时再补"""
+        missing = self.size - len(self._ready)
+        if missing <= 0:
+            return
+        results = await asyncio.gather(
+            *(self.client.conversations.create() for _ in range(missing)), return_exceptions=True
+        )
+        self._ready.extend(r for r in results if isinstance(r, Conversation))
+        errors = [r for r in results if not isinstance(r, Conversation)]
+        if errors:
+            logger.warning(f"failed to create {len(errors)} of {missing} conversations: {errors[0]!r}")
+
+    def start(self):
+        """在后台补足会话池, 不等待; 在服务的 lifespan 里调用, 第一个用户也不用等"""
+        loop = asyncio.get_running_loop()
+        task = self._refill_task
+        # 上一个任务属于已经关闭的事件循环时(脚本里多次 asyncio.run)不会再结束, 直接换掉
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._refill_task = loop.create_task(self.fill())
+
+    async def acquire(self) -> Conversation:
+        if self._ready:
+            self.hits += 1
+            conversation = self._ready.popleft()
+        else:
+            self.misses += 1
+            conversation = await self.client.conversations.create()
+        self.start()
+        return conversation
+
+    def stats(self) -> dict:
+        return {"ready": len(self._ready), "size": self.size, "hits": self.hits, "misses": self.misses}
+
+
+conversation_pool = ConversationPool()
 
 
 async def achat_stream(msg: str, bot_id: str, user_id: str = "user id", conversation_id: str | None = None):
@@ -0,0 +1,75 @@
+"""
+IVF-flat 与精确检索的召回率和延迟对比:
+    python -m examples.bench_ann                        # 使用 ./cache/grape_index 里的语料
+    python -m examples.bench_ann --synthetic 200000     # 成簇的随机向量, 看更大规模下的表现
+查询默认取语料中的向量加少量噪声; --embed-questions 改用 grape.md 的问题标题经嵌入服务得到的向量。
+recall@k 为 IVF 返回的 k 个结果中属于精确 top-k 的比例。
+"""
+import argparse
+import time
+
+import numpy as np
+
+from grpc_embedding.bench_utils import load_questions, timed
+
+from .index_store import INDEX_DIR, PersistedIndex, top_k
+from .ivf_index import IVFFlatIndex
+
+
+def clustered_embeddings(n: int, dim: int, topics: int = 1000, spread: float = 0.8, seed: int = 0) -> np.ndarray:
+    """围绕 topics 个主题中心的随机向量; 真实文本的嵌入是成簇的, 均匀随机向量对 IVF 是最坏情况"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim), dtype=np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    embeddings = centers[rng.integers(topics, size=n)]
+    embeddings += rng.standard_normal((n, dim), dtype=np.float32) * (spread / np.sqrt(dim))
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def perturbed_queries(embeddings: np.ndarray, num_queries: int, noise: float = 0.05, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    queries = np.asarray(embeddings[rng.choice(len(embeddings), num_queries)], dtype=np.float32)
+    queries += rng.standard_normal(queries.shape, dtype=np.float32) * noise
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of IVF-flat against exact search")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--synthetic", type=int, default=None, help="use N random vectors instead of the index")
+    parser.add_argument("--dim", type=int, default=768, help="dimension of synthetic vectors")
+    parser.add_argument("--embed-questions", action="store_true", help="embed grape.md questions as queries")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    if args.synthetic:
+        embeddings = clustered_embeddings(args.synthetic, args.dim)
+    else:
+        embeddings = PersistedIndex(args.index_dir).embeddings
+    if args.embed_questions:
+        from .custom_embedding import CustomEmbedding
+
+        queries = np.asarray(CustomEmbedding().get_text_embedding_batch(load_questions()), dtype=np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    else:
+        queries = perturbed_queries(embeddings, args.queries)
+
+    start = time.perf_counter()
+    ivf = IVFFlatIndex.build(embeddings, args.nlist)
+    build_s = time.perf_counter() - start
+    print(f"{len(embeddings)} vectors, {len(queries)} queries, nlist={ivf.nlist}, build {build_s:.2f}s")
+
+    exact, p50, p99 = timed(lambda q: top_k(embeddings, q, args.top_k)[0], queries)
+    print(f"\n{'method':<14}{'recall@' + str(args.top_k):>10}{'p50 ms':>10}{'p99 ms':>10}")
+    print(f"{'exact':<14}{1.0:>10.3f}{p50:>10.3f}{p99:>10.3f}")
+    for nprobe in args.nprobe:
+        approx, p50, p99 = timed(lambda q: ivf.search(q, args.top_k, nprobe)[0], queries)
+        recall = np.mean([len(np.intersect1d(a, e)) / len(e) for a, e in zip(approx, exact)])
+        print(f"{'ivf nprobe=' + str(nprobe):<14}{recall:>10.3f}{p50:>10.3f}{p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+get_grape_docs 上下文打包前后的 token 数对比:
+    python -m examples.bench_context --budgets 400 800 --modes lexical fusion
+用 grape.md 建一个临时索引(嵌入服务是本进程里的替身 grpc_embedding.standin), 问题集是 grape.md 的 "## n. ...？" 标题。
+    full    原来的输出: 前 SIMILARITY_TOP_K 个块的全文
+    packed  context_packer 按预算打包 CONTEXT_CANDIDATES 个候选
+报告每个问题 observation 的平均 / p90 token 数、节省比例, 以及参考答案保留了多少:
+参考答案是 grape.md 里以该问题为标题的块去掉标题行后的句子, answer kept 为其中出现在结果里的句子按 token 计的比例
+(答案块没有被检索到时为 0), 对所有问题取平均。
+token 数按 context_packer.estimate_tokens 估算。
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+
+from grpc_embedding.bench_utils import GRAPE_MD, load_questions, percentile
+from grpc_embedding.standin import start_standin, stop_standin
+
+from .bench_retrieval import answer_rows
+from .context_packer import ContextPacker, estimate_tokens, format_doc, split_sentences
+from .index_store import MmapVectorRetriever, PersistedIndex
+from .ingest import make_embed_model
+from .lexical_index import BM25Index, FusionRetriever, LexicalRetriever
+from .pipelined_ingest import EMBED_BATCH_SIZE, ingest_files
+from .vector_store_index import CONTEXT_CANDIDATES, FUSION_CANDIDATES, SIMILARITY_TOP_K
+
+
+def make_retriever(mode: str, index: PersistedIndex, bm25: BM25Index, embed_model, k: int):
+    """与 vector_store_index.GrapeIndex.make_retrievers 相同的配置"""
+    if mode == "lexical":
+        return LexicalRetriever(index, bm25, similarity_top_k=k)
+    if mode == "vector":
+        return MmapVectorRetriever(index, embed_model, similarity_top_k=k)
+    num_candidates = max(FUSION_CANDIDATES, k)
+    vector = MmapVectorRetriever(index, embed_model, similarity_top_k=num_candidates)
+    return FusionRetriever(index, bm25, vector, similarity_top_k=k, num_candidates=num_candidates)
+
+
+def answer_kept(answer: str, context: str) -> float:
+    body = [s for s in split_sentences(answer) if not s.startswith("#")]
+    return sum(estimate_tokens(s) for s in body if s in context) / sum(estimate_tokens(s) for s in body)
+
+
+def bench(mode: str, budgets: list[int], answers: dict[str, str], index: PersistedIndex, bm25: BM25Index, embed_model):
+    full_retriever = make_retriever(mode, index, bm25, embed_model, SIMILARITY_TOP_K)
+    candidate_retriever = make_retriever(mode, index, bm25, embed_model, CONTEXT_CANDIDATES)
+    rows = {"full": ([], [])}
+    rows.update({f"packed@{b}": ([], []) for b in budgets})
+    for question, answer in answers.items():
+        full = "\n---\n".join(format_doc(n.node.metadata, n.node.get_content()) for n in full_retriever.retrieve(question))
+        rows["full"][0].append(estimate_tokens(full))
+        rows["full"][1].append(answer_kept(answer, full))
+        candidates = candidate_retriever.retrieve(question)
+        for budget in budgets:
+            chunks = ContextPacker(bm25, token_budget=budget).pack(question, candidates)
+            packed = "\n---\n".join(format_doc(c.node.node.metadata, c.text) for c in chunks)
+            rows[f"packed@{budget}"][0].append(estimate_tokens(packed))
+            rows[f"packed@{budget}"][1].append(answer_kept(answer, packed))
+
+    base = statistics.mean(rows["full"][0])
+    print(f"\nmode={mode}, {len(answers)} questions")
+    print(f"{'context':<14}{'avg tokens':>12}{'p90':>8}{'saved':>8}{'answer kept':>13}")
+    for name, (tokens, kept) in rows.items():
+        avg = statistics.mean(tokens)
+        print(f"{name:<14}{avg:>12.0f}{percentile(tokens, 90):>8}{1 - avg / base:>8.0%}{statistics.mean(kept):>13.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure token savings of get_grape_docs context packing")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[400, 800])
+    parser.add_argument("--modes", nargs="+", choices=["vector", "lexical", "fusion"], default=["lexical", "fusion"])
+    parser.add_argument("--limit", type=int, default=None, help="only use the first N questions")
+    args = parser.parse_args()
+
+    questions = load_questions()
+    server, port, servicer = start_standin()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = os.path.join(tmp, "data")
+            os.makedirs(data_dir)
+            shutil.copy(GRAPE_MD, data_dir)
+            embed_model = make_embed_model(
+                endpoints=[f"localhost:{port}"], cache_path=None, use_stream=False, embed_batch_size=EMBED_BATCH_SIZE
+            )
+            index_dir = os.path.join(tmp, "index")
+            ingest_files([os.path.join(data_dir, os.path.basename(GRAPE_MD))], index_dir, embed_model, workers=0)
+            index = PersistedIndex(index_dir)
+            bm25 = BM25Index.load(index.path)
+            rows = answer_rows(index, questions)
+            # 答案块只有标题、没有正文的问题没法衡量, 跳过
+            answers = {
+                q: index.text(rows[q]) for q in questions
+                if q in rows and any(not s.startswith("#") for s in split_sentences(index.text(rows[q])))
+            }
+            answers = dict(list(answers.items())[: args.limit])
+            for mode in args.modes:
+                bench(mode, args.budgets, answers, index, bm25, embed_model)
+    finally:
+        stop_standin(server, servicer)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+导入吞吐对比, 不需要模型和真实数据:
+    python -m examples.bench_ingest --docs 500 --sections 8 --batch-ms 20 --text-ms 0.5
+语料由 grape.md 的段落随机拼成 --docs 个 markdown 文件, 每个文件 --sections 个问答小节;
+嵌入服务是在本进程里启动的替身(grpc_embedding.standin), --batch-ms / --text-ms 模拟模型的前向计算耗时。
+    serial     loader.py 的做法: IngestionPipeline(MarkdownNodeParser, CustomEmbedding 双向流) 跑完再 save_index
+    pipelined  pipelined_ingest: 解析进程池 + 异步并发嵌入 + 后台写入
+每种模式在单独的子进程里运行, 各用一个新启动的替身服务(服务端缓存不会让后跑的模式占便宜),
+报告 docs/s、chunks/s 以及导入进程和解析子进程的峰值 RSS。
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from grpc_embedding.bench_utils import load_paragraphs
+from grpc_embedding.standin import DIM, start_standin, stop_standin
+
+from .ingest import make_embed_model
+
+MODES = ["serial", "pipelined"]
+
+
+def make_corpus(data_dir: str, docs: int, sections: int, seed: int = 0) -> int:
+    """生成 docs 个 markdown 文件, 返回总字节数"""
+    rng = np.random.default_rng(seed)
+    paragraphs = load_paragraphs()
+    os.makedirs(data_dir, exist_ok=True)
+    total = 0
+    for i in range(docs):
+        lines = [f"# 合成文档 {i}", ""]
+        for j in range(sections):
+            title = paragraphs[rng.integers(len(paragraphs))][:24]
+            lines += [f"## {j + 1}. {title}？", ""]
+            lines += [paragraphs[k] + "\n" for k in rng.integers(len(paragraphs), size=rng.integers(1, 5))]
+        text = "\n".join(lines)
+        with open(os.path.join(data_dir, f"doc_{i:05d}.md"), "w", encoding="utf-8") as f:
+            f.write(text)
+        total += len(text.encode())
+    return total
+
+
+def peak_rss_mb() -> tuple[float, float]:
+    """(当前进程, 已结束的子进程中最大的) 峰值 RSS, Linux 上 ru_maxrss 的单位是 KB"""
+    # ru_maxrss 在 fork / exec 后保留父进程的值, 当前进程的峰值改读 /proc 的 VmHWM, exec 时清零
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as f:
+            self_rss = next((int(line.split()[1]) / 1024 for line in f if line.startswith("VmHWM:")), self_rss)
+    return self_rss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def run_mode(mode: str, data_dir: str, index_dir: str, endpoint: str, workers: int | None) -> dict:
+    """在子进程里运行一种模式"""
+    from llama_index.core import SimpleDirectoryReader
+    from llama_index.core.ingestion import IngestionPipeline
+    from llama_index.core.node_parser import MarkdownNodeParser
+
+    from .index_store import save_index
+    from .pipelined_ingest import EMBED_BATCH_SIZE, ingest_files
+
+    paths = [str(p) for p in SimpleDirectoryReader(input_dir=data_dir).input_files]
+    start = time.perf_counter()
+    if mode == "serial":
+        pipeline = IngestionPipeline(
+            transformations=[MarkdownNodeParser(), make_embed_model(endpoints=[endpoint], cache_path=None)]
+        )
+        docs = SimpleDirectoryReader(input_files=paths, filename_as_id=True).load_data()
+        nodes = pipeline.run(documents=docs)
+        save_index(nodes, index_dir)
+        chunks = len(nodes)
+    else:
+        embed_model = make_embed_model(
+            endpoints=[endpoint], cache_path=None, use_stream=False, embed_batch_size=EMBED_BATCH_SIZE
+        )
+        chunks = ingest_files(paths, index_dir, embed_model, workers=workers)
+    seconds = time.perf_counter() - start
+    rss, child_rss = peak_rss_mb()
+    return {"docs": len(paths), "chunks": chunks, "seconds": seconds, "rss_mb": rss, "child_rss_mb": child_rss}
+
+
+def bench(args: argparse.Namespace):
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.join(tmp, "data")
+        size = make_corpus(data_dir, args.docs, args.sections, args.seed)
+        print(f"corpus: {args.docs} docs, {size / 1024 / 1024:.1f} MB, stand-in server dim={args.dim} "
+              f"batch_ms={args.batch_ms} text_ms={args.text_ms}")
+        print(f"{'mode':<12}{'chunks':>8}{'seconds':>10}{'docs/s':>10}{'chunks/s':>10}{'rss MB':>10}{'worker MB':>11}")
+        for mode in args.modes:
+            server, port, servicer = start_standin(0, args.dim, args.batch_ms, args.text_ms)
+            try:
+                cmd = [
+                    sys.executable, "-m", "examples.bench_ingest", "--run", mode,
+                    "--data-dir", data_dir, "--index-dir", os.path.join(tmp, f"index_{mode}"),
+                    "--endpoint", f"localhost:{port}",
+                ]
+                if args.workers is not None:
+                    cmd += ["--workers", str(args.workers)]
+                out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            finally:
+                stop_standin(server, servicer)
+            r = json.loads(out.strip().splitlines()[-1])
+            print(
+                f"{mode:<12}{r['chunks']:>8}{r['seconds']:>10.2f}{r['docs'] / r['seconds']:>10.1f}"
+                f"{r['chunks'] / r['seconds']:>10.1f}{r['rss_mb']:>10.0f}{r['child_rss_mb']:>11.0f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serial vs pipelined ingestion on a synthetic corpus")
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--sections", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=DIM)
+    parser.add_argument("--batch-ms", type=float, default=20.0, help="simulated model time per forward pass")
+    parser.add_argument("--text-ms", type=float, default=0.5, help="simulated model time per text")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes for pipelined, default cpu count - 1")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    # 以下参数供 bench 启动的子进程使用
+    parser.add_argument("--run", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--index-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--endpoint", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_mode(args.run, args.data_dir, args.index_dir, args.endpoint, args.workers)))
+    else:
+        bench(args)
+
+
+if __name__ == "__main__":
+    main()
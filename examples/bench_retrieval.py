@@ -0,0 +1,168 @@
+"""
+各检索配置的延迟和召回率, 不需要模型和真实数据:
+    python -m examples.bench_retrieval --chunks 1000 10000 --configs vector ivf lexical fusion --nprobe 4 16
+语料: grape.md 原文加上 bench_ingest.make_corpus 生成的同样格式的问答文档, 凑够 --chunks 个块;
+嵌入服务是在本进程里启动的替身(grpc_embedding.standin), 向量是确定的, 同一语料每次得到同一个索引。
+问题集是 grape.md 的 "## n. ...？" 标题, 每个问题的答案是 grape.md 里以该标题开头的块,
+recall@k 为答案出现在前 k 个结果里的问题比例; 合成文档只作为干扰项, 规模越大越难。
+    vector       MmapVectorRetriever, 精确检索
+    ivf          IVFVectorRetriever, 每个 --nprobe 一行
+    lexical      LexicalRetriever, BM25
+    fusion       FusionRetriever, BM25 + 向量检索的 RRF 融合
+每种配置在单独的子进程里运行, 报告 build(建 IVF 等额外结构)和 load(打开索引)耗时、
+每个问题检索的 p50 / p99 延迟(含向替身服务请求查询向量)、子进程的峰值 RSS 和 recall@k。
+索引本身(解析 + 嵌入 + 写入, 含 BM25)的导入耗时每个规模报告一次。
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from grpc_embedding.bench_utils import GRAPE_MD, HEADING_RE, load_questions, timed
+from grpc_embedding.standin import DIM, start_standin, stop_standin
+
+from .bench_ingest import make_corpus, peak_rss_mb
+from .ingest import make_embed_model
+from .vector_store_index import FUSION_CANDIDATES
+
+CONFIGS = ["vector", "ivf", "lexical", "fusion"]
+# 合成文档每个 "# 合成文档 i" 标题自成一块, 每个文档的块数为 sections + 1
+SECTIONS = 8
+
+
+def make_qa_corpus(data_dir: str, chunks: int, seed: int = 0) -> int:
+    """grape.md 加上合成文档, 块数约为 chunks(按标题数估算), 返回总字节数"""
+    os.makedirs(data_dir, exist_ok=True)
+    shutil.copy(GRAPE_MD, data_dir)
+    with open(GRAPE_MD, encoding="utf-8") as f:
+        text = f.read()
+    grape_chunks = sum(line.startswith("#") for line in text.splitlines())
+    docs = math.ceil(max(0, chunks - grape_chunks) / (SECTIONS + 1))
+    return len(text.encode()) + (make_corpus(data_dir, docs, SECTIONS, seed) if docs else 0)
+
+
+def answer_rows(index, questions: list[str]) -> dict[str, int]:
+    """问题 -> grape.md 里以该问题为标题的块的行号"""
+    wanted, grape = set(questions), os.path.basename(GRAPE_MD)
+    answers = {}
+    for row in range(len(index)):
+        first_line = index.text(row).split("\n", 1)[0].strip()
+        m = HEADING_RE.match(first_line)
+        if m and m.group(1) in wanted and m.group(1) not in answers:
+            if index.get_node(row).metadata.get("file_name") == grape:
+                answers[m.group(1)] = row
+    return answers
+
+
+def run_config(config: str, index_dir: str, endpoint: str, nprobe: int, top_ks: list[int]) -> dict:
+    """在子进程里运行一种配置"""
+    from .index_store import MmapVectorRetriever, PersistedIndex, current_dir
+    from .ivf_index import IVFFlatIndex, IVFVectorRetriever, ivf_exists
+    from .lexical_index import BM25Index, FusionRetriever, LexicalRetriever
+
+    # 不用查询向量缓存, 每个问题都向替身服务请求一次
+    embed_model = make_embed_model(endpoints=[endpoint], cache_path=None)
+    k = max(top_ks)
+    build_s = 0.0
+    if config == "ivf" and not ivf_exists(current_dir(index_dir)):
+        start = time.perf_counter()
+        IVFFlatIndex.build(PersistedIndex(index_dir).embeddings).save(current_dir(index_dir))
+        build_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = PersistedIndex(index_dir)
+    if config == "vector":
+        retriever = MmapVectorRetriever(index, embed_model, similarity_top_k=k)
+    elif config == "ivf":
+        retriever = IVFVectorRetriever(index, IVFFlatIndex.load(index.path), embed_model, nprobe, similarity_top_k=k)
+    elif config == "lexical":
+        retriever = LexicalRetriever(index, BM25Index.load(index.path), similarity_top_k=k)
+    else:
+        num_candidates = max(FUSION_CANDIDATES, k)
+        vector = MmapVectorRetriever(index, embed_model, similarity_top_k=num_candidates)
+        retriever = FusionRetriever(
+            index, BM25Index.load(index.path), vector, similarity_top_k=k, num_candidates=num_candidates
+        )
+    load_s = time.perf_counter() - start
+
+    questions = load_questions()
+    answers = answer_rows(index, questions)
+    questions = [q for q in questions if q in answers]
+    # 第一次检索会触发 gRPC 连接建立和向量矩阵的缺页, 不计入延迟
+    retriever.retrieve(questions[0])
+    row_of = {node_id: row for row, node_id in enumerate(index.node_ids)}
+    results, p50, p99 = timed(lambda q: [row_of[n.node.node_id] for n in retriever.retrieve(q)], questions)
+    recall = {
+        str(top_k): sum(answers[q] in rows[:top_k] for q, rows in zip(questions, results)) / len(questions)
+        for top_k in top_ks
+    }
+    rss, _ = peak_rss_mb()
+    return {
+        "chunks": len(index), "questions": len(questions), "build_s": build_s, "load_s": load_s,
+        "p50_ms": p50, "p99_ms": p99, "rss_mb": rss, "recall": recall,
+    }
+
+
+def bench(chunks: int, args: argparse.Namespace):
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir, index_dir = os.path.join(tmp, "data"), os.path.join(tmp, "index")
+        size = make_qa_corpus(data_dir, chunks, args.seed)
+        server, port, servicer = start_standin(0, args.dim)
+        try:
+            from .pipelined_ingest import EMBED_BATCH_SIZE, ingest_files
+
+            embed_model = make_embed_model(
+                endpoints=[f"localhost:{port}"], cache_path=None, use_stream=False, embed_batch_size=EMBED_BATCH_SIZE
+            )
+            paths = [os.path.join(data_dir, name) for name in sorted(os.listdir(data_dir))]
+            start = time.perf_counter()
+            count = ingest_files(paths, index_dir, embed_model)
+            print(f"\n{count} chunks from {len(paths)} docs ({size / 1024 / 1024:.1f} MB), "
+                  f"ingest {time.perf_counter() - start:.2f}s, stand-in dim={args.dim}")
+
+            runs = [(c, n) for c in args.configs for n in (args.nprobe if c == "ivf" else [0])]
+            recall_names = [f"recall@{k}" for k in args.top_k]
+            print(f"{'config':<16}{'build s':>9}{'load s':>8}{'p50 ms':>9}{'p99 ms':>9}{'rss MB':>8}"
+                  + "".join(f"{name:>11}" for name in recall_names))
+            for config, nprobe in runs:
+                cmd = [
+                    sys.executable, "-m", "examples.bench_retrieval", "--run", config,
+                    "--index-dir", index_dir, "--endpoint", f"localhost:{port}",
+                    "--nprobe", str(nprobe), "--top-k", *map(str, args.top_k),
+                ]
+                r = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout.strip().splitlines()[-1])
+                name = f"ivf nprobe={nprobe}" if config == "ivf" else config
+                print(f"{name:<16}{r['build_s']:>9.2f}{r['load_s']:>8.2f}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+                      f"{r['rss_mb']:>8.0f}" + "".join(f"{r['recall'][str(k)]:>11.3f}" for k in args.top_k))
+        finally:
+            stop_standin(server, servicer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency, memory and recall of each retriever configuration")
+    parser.add_argument("--chunks", type=int, nargs="+", default=[1000, 10000], help="corpus sizes in chunks")
+    parser.add_argument("--configs", nargs="+", choices=CONFIGS, default=CONFIGS)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--top-k", type=int, nargs="+", default=[1, 3, 10])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dim", type=int, default=DIM)
+    # 以下参数供 bench 启动的子进程使用
+    parser.add_argument("--run", choices=CONFIGS, help=argparse.SUPPRESS)
+    parser.add_argument("--index-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--endpoint", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_config(args.run, args.index_dir, args.endpoint, args.nprobe[0], args.top_k)))
+    else:
+        for chunks in args.chunks:
+            bench(chunks, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+对比 top-k 检索的两条路径, 不需要嵌入服务和真实数据:
+    python -m examples.bench_retriever --sizes 10000 100000 1000000 --dim 768
+    llama_index  SimpleVectorStore 使用的 get_top_k_embeddings, 逐条计算相似度再用堆取 top-k
+    numpy        index_store.top_k, 一次矩阵-向量乘法 + argpartition
+    numpy+mask   同上, 带一个只保留 10% 行的 metadata 过滤掩码
+llama_index 路径需要把向量存成 list[list[float]], 内存开销很大, 超过 --baseline-max-size 的规模只测 numpy。
+"""
+import argparse
+
+import numpy as np
+from llama_index.core.indices.query.embedding_utils import get_top_k_embeddings
+
+from grpc_embedding.bench_utils import timed
+
+from .index_store import top_k
+
+
+def random_embeddings(n: int, dim: int, seed: int = 0, chunk: int = 100_000) -> np.ndarray:
+    """分块生成并归一化, 避免 1M 规模时产生 float64 的中间矩阵"""
+    rng = np.random.default_rng(seed)
+    embeddings = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, chunk):
+        block = rng.standard_normal((min(chunk, n - start), dim), dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        embeddings[start:start + len(block)] = block
+    return embeddings
+
+
+def timeit(fn, queries: np.ndarray) -> tuple[float, float]:
+    """每条查询的 p50 / p99 延迟(毫秒)"""
+    _, p50, p99 = timed(fn, queries)
+    return p50, p99
+
+
+def bench(n: int, dim: int, k: int, num_queries: int, baseline_max_size: int):
+    embeddings = random_embeddings(n, dim)
+    queries = random_embeddings(num_queries, dim, seed=1)
+    mask = np.random.default_rng(2).random(n) < 0.1
+
+    rows = [("numpy", *timeit(lambda q: top_k(embeddings, q, k), queries))]
+    rows.append(("numpy+mask", *timeit(lambda q: top_k(embeddings, q, k, mask), queries)))
+
+    if n <= baseline_max_size:
+        embedding_lists = embeddings.tolist()
+        ids = list(range(n))
+        # 与 numpy 路径的结果核对
+        _, expected = get_top_k_embeddings(queries[0].tolist(), embedding_lists, similarity_top_k=k, embedding_ids=ids)
+        assert list(top_k(embeddings, queries[0], k)[0]) == expected
+        baseline_queries = queries[: max(1, num_queries // 10)]
+        rows.insert(0, (
+            "llama_index",
+            *timeit(
+                lambda q: get_top_k_embeddings(q.tolist(), embedding_lists, similarity_top_k=k, embedding_ids=ids),
+                baseline_queries,
+            ),
+        ))
+
+    print(f"\nn={n}, dim={dim}, top_k={k}")
+    print(f"{'path':<14}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, p50, p99 in rows:
+        print(f"{name:<14}{p50:>10.2f}{p99:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark top-k retrieval paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--baseline-max-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        bench(n, args.dim, args.top_k, args.queries, args.baseline_max_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+get_grape_docs 的上下文打包: 检索结果在 ReAct 的每一轮都会作为 observation 重新发给 Coze, 只留下和问题相关的部分。
+    1. 分数截断  多取几个候选(CONTEXT_CANDIDATES), 只保留分数不低于第一名 min_relative_score 倍的, 不再固定取 top_k
+    2. 去重      与已选的块字二元组重合度达到 max_overlap 的块丢弃(同一段文字在多个文件里出现, 或相邻块重叠)
+    3. 句子裁剪  块放得下时原样保留; 超出预算时按句切分, 用 BM25 的 idf 给每句与问题的词重合打分,
+                 先丢得分低(同分时靠后)的句子, 标题行总是保留, 省略的地方用 … 标出。
+                 回答问题的句子很少重复问题里的词, 得分只用来决定丢哪些, 不用来筛选
+    4. token 预算 所有块(含 metadata 标题)合计不超过 token_budget, 除第一名外单块不超过 max_chunk_tokens
+token 数按 estimate_tokens 估算: 汉字和标点各算 1 个, 英文和数字每 4 个字符算 1 个, 与 Coze 背后模型的分词大致相当。
+"""
+import math
+import re
+from dataclasses import dataclass
+
+from llama_index.core.schema import NodeWithScore
+
+from .lexical_index import BM25Index, tokenize
+
+TOKEN_BUDGET = 800
+MAX_CHUNK_TOKENS = 320
+MIN_RELATIVE_SCORE = 0.5
+MAX_OVERLAP = 0.8
+# 块剩余预算少于这个数时不再加入新块
+MIN_CHUNK_TOKENS = 40
+# get_grape_docs 结果里保留的 metadata 字段
+METADATA_KEYS = ("file_path", "header_path")
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+|\S")
+_SENTENCE_RE = re.compile(r"[^\n。！？；!?;]*[。！？；!?;]?")
+
+
+def estimate_tokens(text: str) -> int:
+    return sum(math.ceil(len(t) / 4) if t.isascii() and t.isalnum() else 1 for t in _TOKEN_RE.findall(text))
+
+
+def split_sentences(text: str) -> list[str]:
+    """按句末标点和换行切分, 每个 markdown 列表项也各成一句; 标题行整行算一句"""
+    res = []
+    for line in text.splitlines():
+        if line.lstrip().startswith("#"):
+            res.append(line.strip())
+        else:
+            res.extend(s.strip() for s in _SENTENCE_RE.findall(line) if s.strip())
+    return [s for s in res if s]
+
+
+def format_doc(metadata: dict, text: str) -> str:
+    """get_grape_docs 里一个检索结果的格式"""
+    res = "📁 Metadata:\n"
+    for k in METADATA_KEYS:
+        if k in metadata:
+            res += f"- {k}: {metadata[k]}\n"
+    return res + "📝 Text:\n" + text
+
+
+@dataclass
+class PackedChunk:
+    node: NodeWithScore
+    text: str
+    tokens: int
+
+
+class ContextPacker:
+    def __init__(
+        self,
+        bm25: BM25Index,
+        token_budget: int = TOKEN_BUDGET,
+        max_chunk_tokens: int = MAX_CHUNK_TOKENS,
+        min_relative_score: float = MIN_RELATIVE_SCORE,
+        max_overlap: float = MAX_OVERLAP,
+    ):
+        self.bm25 = bm25
+        self.token_budget = token_budget
+        self.max_chunk_tokens = max_chunk_tokens
+        self.min_relative_score = min_relative_score
+        self.max_overlap = max_overlap
+
+    def _query_weights(self, query: str) -> dict[str, float]:
+        """查询里的词 -> idf; 词表里没有的词(跨词边界切出的二元组)不计分"""
+        return {t: float(self.bm25.idf[self.bm25.vocab[t]]) for t in set(tokenize(query)) if t in self.bm25.vocab}
+
+    def trim(self, text: str, weights: dict[str, float], budget: int) -> str:
+        """放得下时返回原文; 否则按得分从高到低(同分时靠前的优先)留句子, 按原顺序拼接, 不超过 budget 个 token"""
+        if estimate_tokens(text) <= budget:
+            return text.strip()
+        sentences = split_sentences(text)
+        if not sentences:
+            return ""
+        keep: set[int] = set()
+        used = 0
+        if sentences[0].startswith("#"):
+            keep.add(0)
+            used += estimate_tokens(sentences[0])
+        scores = [sum(weights.get(t, 0.0) for t in set(tokenize(s))) for s in sentences]
+        for i in sorted(range(len(sentences)), key=lambda i: (-scores[i], i)):
+            if i in keep:
+                continue
+            cost = estimate_tokens(sentences[i])
+            if used + cost > budget:
+                continue
+            keep.add(i)
+            used += cost
+        parts, prev = [], -1
+        for i in sorted(keep):
+            if prev >= 0 and i != prev + 1:
+                parts.append("…")
+            parts.append(sentences[i])
+            prev = i
+        if keep and max(keep) < len(sentences) - 1:
+            parts.append("…")
+        return "\n".join(parts)
+
+    def pack(self, query: str, nodes: list[NodeWithScore]) -> list[PackedChunk]:
+        """nodes 按分数从高到低排列"""
+        if not nodes:
+            return []
+        weights = self._query_weights(query)
+        top = nodes[0].score or 0.0
+        res: list[PackedChunk] = []
+        seen: list[set[str]] = []
+        used = 0
+        for node in nodes:
+            if res and top > 0 and (node.score or 0.0) < top * self.min_relative_score:
+                break
+            text = node.node.get_content()
+            terms = set(tokenize(text))
+            if any(len(terms & s) >= self.max_overlap * min(len(terms), len(s)) for s in seen if s and terms):
+                continue
+            seen.append(terms)
+            banner_tokens = estimate_tokens(format_doc(node.node.metadata, ""))
+            # 第一名最可能是答案, 可以用满整个预算; 其余的块各不超过 max_chunk_tokens
+            budget = self.token_budget - used if not res else min(self.max_chunk_tokens, self.token_budget - used)
+            budget -= banner_tokens
+            if budget < MIN_CHUNK_TOKENS:
+                break
+            body = self.trim(text, weights, budget)
+            if not body:
+                continue
+            tokens = banner_tokens + estimate_tokens(body)
+            res.append(PackedChunk(node, body, tokens))
+            used += tokens
+        return res
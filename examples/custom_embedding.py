@@ -15,35 +15,152 @@
 # print(embeddings[:5])
 
 # custom embedding
-from typing import Any
+import asyncio
+import threading
+from collections.abc import Awaitable, Callable
+from typing import Any, Literal
 
-import grpc
 from llama_index.core.embeddings import BaseEmbedding
-from pydantic import PrivateAttr
+from pydantic import Field, PrivateAttr
 
-from grpc_embedding import get_embedding_pb2, get_embedding_pb2_grpc
+from grpc_embedding import get_embedding_pb2
+from grpc_embedding.cache import EmbeddingCache
+from grpc_embedding.codec import ENCODINGS, decode_embedding, decode_embeddings
+from grpc_embedding.pool import ChannelPool, EmbeddingServiceError
+
+EMBEDDING_SERVER = 'localhost:50051'
 
 
 class CustomEmbedding(BaseEmbedding):
-    _channel: grpc.Channel = PrivateAttr()
-    _stub: get_embedding_pb2_grpc.EmbeddingServiceStub = PrivateAttr()
+    # 与服务端模型对应, 同时作为本地缓存 key 的一部分
+    model_name: str = "text2vec-base-chinese"
+    # 嵌入服务的各个副本, 请求按 lb_policy 分配, 失败时换副本重试, 最多 max_attempts 次
+    endpoints: list[str] = Field(default_factory=lambda: [EMBEDDING_SERVER])
+    lb_policy: Literal["least_outstanding", "round_robin"] = "least_outstanding"
+    max_attempts: int = Field(default=3, gt=0)
+    # get_text_embedding_batch 按 embed_batch_size 切块, 每块走一次 GetTextEmbeddings
+    embed_batch_size: int = Field(default=32, gt=0, le=2048)
+    # 批量嵌入改走双向流 StreamTextEmbeddings, 适合大批量导入(配合较大的 embed_batch_size)
+    use_stream: bool = False
+    # 单次 unary 调用的 deadline(秒) 和 _aget_text_embeddings 的最大并发 RPC 数
+    timeout: float = 10.0
+    max_concurrency: int = Field(default=4, gt=0)
+    # 本地向量缓存(SQLite), 命中的文本不再请求服务端; None 表示不启用
+    cache_path: str | None = None
+    cache_max_bytes: int = 64 * 1024 * 1024
+    # 服务端推理后端, 不同后端的向量有细微差别, 和 model_name 一起作为缓存 key; None 表示首次查缓存时用 GetStats 询问各副本
+    backend: str | None = None
+    # 服务端返回向量的格式: float32/float16 为二进制打包, 客户端零拷贝解码; float_list 为旧的 repeated float
+    # float16 的向量精度较低, 与另两种分开缓存
+    encoding: Literal["float_list", "float32", "float16"] = "float32"
+
+    _pool: ChannelPool = PrivateAttr()
+    # asyncio.Semaphore 绑定在事件循环上, 换了循环就重新创建
+    _aloop: asyncio.AbstractEventLoop | None = PrivateAttr(default=None)
+    _asemaphore: asyncio.Semaphore | None = PrivateAttr(default=None)
+    # 缓存 key 依赖服务端后端, 第一次用到时才打开
+    _cache: EmbeddingCache | None = PrivateAttr(default=None)
+    _cache_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
     def __init__(
         self,
         **kwargs: Any,
     ) -> None:
         super().__init__(**kwargs)
-        self._channel = grpc.insecure_channel('localhost:50051')
-        self._stub = get_embedding_pb2_grpc.EmbeddingServiceStub(self._channel)
+        self._pool = ChannelPool(self.endpoints, policy=self.lb_policy, max_attempts=self.max_attempts)
+
+    def _server_backend(self, stats: dict[str, get_embedding_pb2.StatsResponse]) -> str:
+        """各副本必须是同一个模型和后端, 否则缓存里会混入不同来源的向量"""
+        if not stats:
+            raise EmbeddingServiceError(f"no embedding server in {self.endpoints} answered GetStats")
+        identities = {address: (r.model, r.backend or "unknown") for address, r in stats.items()}
+        if len(set(identities.values())) > 1:
+            raise EmbeddingServiceError(f"embedding servers disagree on model/backend: {identities}")
+        return next(iter(identities.values()))[1]
+
+    def _open_cache(self, backend: str) -> EmbeddingCache:
+        precision = "float16" if self.encoding == "float16" else "float32"
+        with self._cache_lock:
+            if self._cache is None:
+                self._cache = EmbeddingCache(
+                    f"{self.model_name}:{backend}:{precision}",
+                    max_bytes=self.cache_max_bytes,
+                    db_path=self.cache_path,
+                )
+        return self._cache
+
+    def _get_cache(self) -> EmbeddingCache | None:
+        if not self.cache_path or self._cache is not None:
+            return self._cache
+        backend = self.backend
+        if backend is None:
+            request = get_embedding_pb2.StatsRequest()
+            backend = self._server_backend(
+                self._pool.call_each(lambda stub: stub.GetStats(request, timeout=self.timeout))
+            )
+        return self._open_cache(backend)
+
+    async def _aget_cache(self) -> EmbeddingCache | None:
+        if not self.cache_path or self._cache is not None:
+            return self._cache
+        backend = self.backend
+        if backend is None:
+            request = get_embedding_pb2.StatsRequest()
+            backend = self._server_backend(
+                await self._pool.acall_each(lambda stub: stub.GetStats(request, timeout=self.timeout))
+            )
+        return self._open_cache(backend)
+
+    @staticmethod
+    def _lookup(cache: EmbeddingCache, texts: list[str]) -> tuple[list[str], list[list[float] | None], list[int]]:
+        keys = [cache.key(t) for t in texts]
+        res = []
+        for key in keys:
+            vector = cache.get(key)
+            res.append(vector.tolist() if vector is not None else None)
+        misses = [i for i, e in enumerate(res) if e is None]
+        return keys, res, misses
+
+    @staticmethod
+    def _store(
+        cache: EmbeddingCache, keys: list[str], res: list, misses: list[int], embeddings: list[list[float]]
+    ) -> list[list[float]]:
+        for i, embedding in zip(misses, embeddings):
+            res[i] = embedding
+            cache.put(keys[i], embedding)
+        return res
+
+    def _get_cached(
+        self, texts: list[str], fetch: Callable[[list[str]], list[list[float]]]
+    ) -> list[list[float]]:
+        """先查本地缓存, 只把未命中的文本一次性交给 fetch"""
+        cache = self._get_cache()
+        if cache is None:
+            return fetch(texts)
+        keys, res, misses = self._lookup(cache, texts)
+        if not misses:
+            return res
+        return self._store(cache, keys, res, misses, fetch([texts[i] for i in misses]))
+
+    async def _aget_cached(
+        self, texts: list[str], afetch: Callable[[list[str]], Awaitable[list[list[float]]]]
+    ) -> list[list[float]]:
+        cache = await self._aget_cache()
+        if cache is None:
+            return await afetch(texts)
+        keys, res, misses = self._lookup(cache, texts)
+        if not misses:
+            return res
+        return self._store(cache, keys, res, misses, await afetch([texts[i] for i in misses]))
+
+    # RPC 失败时由连接池重试, 仍然失败则抛出 EmbeddingServiceError, 不会返回空向量
 
     def _get_embedding(self, text: str) -> list[float]:
-        request = get_embedding_pb2.TextRequest(text=text)
-        try:
-            # 发起请求
-            response = self._stub.GetTextEmbedding(request)
-            return response.embedding
-        except grpc.RpcError as e:
-            print(f"RPC failed: {e.code()} - {e.details()}")
-            return []
+        return self._get_cached([text], lambda texts: [self._request_embedding(texts[0])])[0]
+
+    def _request_embedding(self, text: str) -> list[float]:
+        request = get_embedding_pb2.TextRequest(text=text, encoding=ENCODINGS[self.encoding])
+        response = self._pool.call(lambda stub: stub.GetTextEmbedding(request, timeout=self.timeout))
+        return decode_embedding(response).tolist()
 
     def _get_query_embedding(self, query: str) -> list[float]:
         return self._get_embedding(query)
@@ -51,17 +168,88 @@ class CustomEmbedding(BaseEmbedding):
     def _get_text_embedding(self, text: str) -> list[float]:
         return self._get_embedding(text)
 
+    def _get_embeddings(self, texts: list[str]) -> list[list[float]]:
+        request = get_embedding_pb2.TextsRequest(texts=texts, encoding=ENCODINGS[self.encoding])
+        response = self._pool.call(lambda stub: stub.GetTextEmbeddings(request, timeout=self.timeout))
+        return decode_embeddings(response).tolist()
+
+    def _stream_embeddings(self, texts: list[str]) -> list[list[float]]:
+        encoding = ENCODINGS[self.encoding]
+
+        def run(stub) -> list[list[float]]:
+            # 请求用生成器惰性产生, gRPC 按流控窗口读取, 服务端边算边推回; 重试时整批重发
+            requests = (
+                get_embedding_pb2.SeqTextRequest(seq_id=i, text=t, encoding=encoding) for i, t in enumerate(texts)
+            )
+            res: list[list[float] | None] = [None] * len(texts)
+            for response in stub.StreamTextEmbeddings(requests):
+                res[response.seq_id] = decode_embedding(response.embedding).tolist()
+            return res
+
+        return self._pool.call(run)
+
     def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
-        return [self._get_embedding(s) for s in texts]
+        return self._get_cached(texts, self._request_text_embeddings)
+
+    def _request_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        if self.use_stream:
+            return self._stream_embeddings(texts)
+        res = []
+        for i in range(0, len(texts), self.embed_batch_size):
+            res.extend(self._get_embeddings(texts[i:i + self.embed_batch_size]))
+        return res
+
+    def _get_asemaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._asemaphore is None or self._aloop is not loop:
+            self._aloop = loop
+            self._asemaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._asemaphore
+
+    async def _aget_embedding(self, text: str) -> list[float]:
+        async def afetch(texts: list[str]) -> list[list[float]]:
+            return [await self._arequest_embedding(texts[0])]
+
+        return (await self._aget_cached([text], afetch))[0]
+
+    async def _arequest_embedding(self, text: str) -> list[float]:
+        request = get_embedding_pb2.TextRequest(text=text, encoding=ENCODINGS[self.encoding])
+        response = await self._pool.acall(lambda stub: stub.GetTextEmbedding(request, timeout=self.timeout))
+        return decode_embedding(response).tolist()
+
+    async def _aget_embeddings(self, texts: list[str]) -> list[list[float]]:
+        request = get_embedding_pb2.TextsRequest(texts=texts, encoding=ENCODINGS[self.encoding])
+        async with self._get_asemaphore():
+            response = await self._pool.acall(lambda stub: stub.GetTextEmbeddings(request, timeout=self.timeout))
+        return decode_embeddings(response).tolist()
 
     async def _aget_query_embedding(self, query: str) -> list[float]:
-        return self._get_query_embedding(query)
+        return await self._aget_embedding(query)
 
     async def _aget_text_embedding(self, text: str) -> list[float]:
-        return self._get_text_embedding(text)
+        return await self._aget_embedding(text)
+
+    async def _aget_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return await self._aget_cached(texts, self._arequest_text_embeddings)
+
+    async def _arequest_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        # 按 embed_batch_size 切块并发请求, 同时在途的 RPC 不超过 max_concurrency
+        chunks = await asyncio.gather(
+            *(
+                self._aget_embeddings(texts[i:i + self.embed_batch_size])
+                for i in range(0, len(texts), self.embed_batch_size)
+            )
+        )
+        return [e for chunk in chunks for e in chunk]
+
+    def close(self):
+        """写完本地缓存并关闭到服务端的连接, 之后不能再使用"""
+        with self._cache_lock:
+            if self._cache is not None:
+                self._cache.close()
+        self._pool.close()
 
 
 if __name__ == '__main__':
     x = CustomEmbedding()
     print(x.get_query_embedding('sss'))
-
@@ -17,7 +17,7 @@ from llama_index.core.llms import (
 )
 from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
 
-from .async_coze_llm import achat_stream, acoze
+from .async_coze_llm import achat_stream, acoze, conversation_pool
 from .coze_llm import BOT_ID, USER_ID, chat_no_stream, chat_stream, coze
 from .utils import Colors
 
@@ -32,7 +32,8 @@ class CozeLLM(CustomLLM):
     # Initialize Coze client
     coze: Coze = coze
     acoze: AsyncCoze = acoze
-    conversation: Any = coze.conversations.create()
+    # 会话在第一次对话时才创建, 每个 CozeLLM(每个 websocket 连接)各用各的
+    conversation: Any = None
     aconversation: Any = None
     bot_id: str = BOT_ID
     user_id: str = USER_ID
@@ -51,12 +52,17 @@ class CozeLLM(CustomLLM):
             model_name=self.model_name,
         )
 
+    def get_conversation(self) -> Any:
+        if self.conversation is None:
+            self.conversation = self.coze.conversations.create()
+        return self.conversation
+
     @llm_completion_callback()
     def complete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
         # 在调试模式下打印彩色提示
         if logger.isEnabledFor(logging.DEBUG):
             print(f"{Colors.USER_PROMPT}User prompt: {prompt}{Colors.RESET}")
-        response = chat_no_stream(prompt, self.bot_id, self.user_id, self.conversation.id)
+        response = chat_no_stream(prompt, self.bot_id, self.user_id, self.get_conversation().id)
         if logger.isEnabledFor(logging.DEBUG):
             print(f"{Colors.RESPONSE}Responce: {response}{Colors.RESET}")
         return CompletionResponse(text=response)
@@ -67,7 +73,7 @@ class CozeLLM(CustomLLM):
         if logger.isEnabledFor(logging.DEBUG):
             print(f"{Colors.USER_PROMPT}User prompt: {prompt}{Colors.RESET}")
         response = ""
-        for c_type, token in chat_stream(prompt, self.bot_id, self.user_id, self.conversation.id):
+        for c_type, token in chat_stream(prompt, self.bot_id, self.user_id, self.get_conversation().id):
             if c_type == "content":
                 if logger.isEnabledFor(logging.DEBUG):
                     print(f"{Colors.RESPONSE}{token}{Colors.RESET}", end="", flush=True)
@@ -89,7 +95,8 @@ class CozeLLM(CustomLLM):
                 print(f"{Colors.USER_PROMPT}User prompt: {prompt}{Colors.RESET}")
             response = ""
             if not self.aconversation:
-                self.aconversation = await self.acoze.conversations.create()
+                # 从预先创建好的会话池里取, 不用等一次创建会话的请求
+                self.aconversation = await conversation_pool.acquire()
             async for c_type, delta in achat_stream(prompt, self.bot_id, self.user_id, self.aconversation.id):
                 if c_type == "content":
                     response += delta
@@ -1,11 +1,11 @@
 from llama_index.core import VectorStoreIndex
 
 from .custom_llm import CozeLLM
-from .loader import nodes
+from .loader import load_nodes
 
 llm = CozeLLM()
 
-index = VectorStoreIndex(nodes)
+index = VectorStoreIndex(load_nodes())
 
 agent = index.as_query_engine(llm=llm, streaming=True)
 
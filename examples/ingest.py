@@ -0,0 +1,176 @@
+"""
+增量导入: 按文件内容的 sha256 判断 ./data 下哪些文件新增、修改或删除,
+只对新增和修改的文件重新解析、嵌入, 删除的文件连同它的节点一起从索引里去掉, 其余节点沿用索引里已有的向量。
+    python -m examples.ingest              # 同步一次
+    python -m examples.ingest --watch      # 每隔 --interval 秒检查一次
+    python -m examples.ingest --pipelined  # 解析、嵌入、写入并行, 适合一次导入大量文件
+各文件的哈希与索引写在同一代里(manifest.json, 见 index_store)。导入写出新的一代后, 运行中的服务在下一次检索前
+自动重新加载, 不需要重启; 导入失败或被打断时原来的索引和 manifest 都不变。
+没有改动时不写新的一代, 只给旧版本保存的、没有 BM25 部分的索引补上 BM25。
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.ingestion import IngestionPipeline
+from llama_index.core.node_parser import MarkdownNodeParser
+from llama_index.core.schema import BaseNode
+
+from .custom_embedding import CustomEmbedding
+from .index_store import INDEX_DIR, PersistedIndex, current_dir, index_exists, save_index
+from .lexical_index import BM25Index, bm25_exists
+from .pipelined_ingest import EMBED_BATCH_SIZE, ingest_files
+
+DATA_DIR = "./data"
+PIPELINE_DIR = "./cache/pipeline_storage"
+
+
+def make_embed_model(**kwargs) -> CustomEmbedding:
+    # 导入时走双向流, 每次 get_text_embedding_batch 最多推送 1024 条; 已嵌入过的文本直接读本地缓存
+    return CustomEmbedding(
+        **{
+            "use_stream": True,
+            "embed_batch_size": 1024,
+            "cache_path": "./cache/client_embedding_cache.sqlite",
+            **kwargs,
+        }
+    )
+
+
+def make_sync_embed_model(pipelined: bool = False) -> CustomEmbedding:
+    # pipelined_ingest 自己按 EMBED_BATCH_SIZE 分批并发请求, 不走双向流
+    return make_embed_model(use_stream=False, embed_batch_size=EMBED_BATCH_SIZE) if pipelined else make_embed_model()
+
+
+def make_pipeline(embed_model: CustomEmbedding) -> IngestionPipeline:
+    pipeline = IngestionPipeline(
+        transformations=[
+            MarkdownNodeParser(),
+            embed_model
+        ],
+    )
+    if os.path.exists(PIPELINE_DIR):
+        pipeline.load(PIPELINE_DIR)
+    return pipeline
+
+
+def file_hashes(data_dir: str = DATA_DIR) -> dict[str, str]:
+    """文件路径与 SimpleDirectoryReader 写入 metadata 的 file_path 一致"""
+    res = {}
+    for path in SimpleDirectoryReader(input_dir=data_dir).input_files:
+        with open(path, "rb") as f:
+            res[str(path)] = hashlib.sha256(f.read()).hexdigest()
+    return res
+
+
+def load_manifest(index_dir: str = INDEX_DIR) -> dict[str, str]:
+    path = os.path.join(current_dir(index_dir), "manifest.json")
+    if not os.path.exists(path) or not index_exists(index_dir):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def existing_nodes(index_dir: str, skip_files: set[str]) -> list[BaseNode]:
+    """索引里不属于 skip_files 的节点, 向量直接取自索引"""
+    if not index_exists(index_dir):
+        return []
+    index = PersistedIndex(index_dir)
+    res = []
+    for row in range(len(index)):
+        node = index.get_node(row)
+        if node.metadata.get("file_path") not in skip_files:
+            res.append(node.model_copy(update={"embedding": index.embeddings[row].tolist()}))
+    return res
+
+
+def backfill_bm25(index_dir: str = INDEX_DIR) -> bool:
+    """旧版本保存的索引没有 BM25 部分, 用已保存的正文补建到当前这一代里, 不需要嵌入; 补建了返回 True"""
+    if not index_exists(index_dir) or bm25_exists(current_dir(index_dir)):
+        return False
+    index = PersistedIndex(index_dir)
+    BM25Index.build([index.text(row) for row in range(len(index))]).save(index.path)
+    print(f"✅ added BM25 index to {index.path}")
+    return True
+
+
+def sync(
+    data_dir: str = DATA_DIR,
+    index_dir: str = INDEX_DIR,
+    pipeline: IngestionPipeline | None = None,
+    pipelined: bool = False,
+    workers: int | None = None,
+    rebuild: bool = False,
+    embed_model: CustomEmbedding | None = None,
+) -> dict:
+    """
+    把 data_dir 的改动应用到索引上, 返回各类文件数和索引节点数。
+    pipelined 为 True 时改用 pipelined_ingest, 解析、嵌入和写入并行, 用 workers 个解析进程;
+    rebuild 为 True 时忽略 manifest, 所有文件都重新导入。
+    embed_model 由调用方创建(make_sync_embed_model)时可以在多次同步之间复用; 不传时这次同步自己创建, 结束时关闭。
+    """
+    manifest = {} if rebuild else load_manifest(index_dir)
+    hashes = file_hashes(data_dir)
+    added = [p for p in hashes if p not in manifest]
+    changed = [p for p in hashes if p in manifest and manifest[p] != hashes[p]]
+    removed = [p for p in manifest if p not in hashes]
+    stats = {"added": len(added), "changed": len(changed), "removed": len(removed)}
+    if not (added or changed or removed):
+        # 没有改动时不写新的一代, 只给旧索引补上 BM25; 有改动时新的一代总会带上 BM25
+        backfill_bm25(index_dir)
+        return stats
+
+    # 没有 manifest 时不知道索引里的节点来自哪个版本的文件, 全部重新导入(向量大多能命中缓存)
+    nodes = existing_nodes(index_dir, set(changed) | set(removed)) if manifest else []
+    own_model = embed_model is None and (pipelined or pipeline is None)
+    if own_model:
+        embed_model = make_sync_embed_model(pipelined)
+    try:
+        if pipelined:
+            stats["nodes"] = ingest_files(added + changed, index_dir, embed_model, nodes, hashes, workers=workers)
+            return stats
+        if added or changed:
+            pipeline = pipeline or make_pipeline(embed_model)
+            docs = SimpleDirectoryReader(input_files=added + changed, filename_as_id=True).load_data()
+            nodes += pipeline.run(documents=docs, show_progress=True)
+            pipeline.persist(PIPELINE_DIR)
+    finally:
+        # 自己创建的客户端用完就关, 否则它的缓存(写盘线程、SQLite 连接、内存 LRU)一直留到进程退出
+        if own_model:
+            embed_model.close()
+
+    save_index(nodes, index_dir, hashes)
+    stats["nodes"] = len(nodes)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally sync ./data into the grape docs index")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--watch", action="store_true", help="keep polling data-dir for changes")
+    parser.add_argument("--interval", type=float, default=5.0)
+    parser.add_argument("--pipelined", action="store_true", help="parse, embed and write concurrently")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes for --pipelined, default cpu count - 1 (0 parses in a thread)")
+    args = parser.parse_args()
+
+    # --watch 时所有同步共用一个嵌入客户端
+    embed_model = make_sync_embed_model(args.pipelined)
+    try:
+        while True:
+            start = time.perf_counter()
+            stats = sync(
+                args.data_dir, args.index_dir, pipelined=args.pipelined, workers=args.workers, embed_model=embed_model
+            )
+            if "nodes" in stats:
+                print(f"✅ synced {stats} in {time.perf_counter() - start:.2f}s")
+            elif not args.watch:
+                print("✅ index is up to date")
+            if not args.watch:
+                break
+            time.sleep(args.interval)
+    finally:
+        embed_model.close()
@@ -0,0 +1,180 @@
+"""
+IVF-flat 近似最近邻索引, 知识库变大后替代逐行精确检索:
+    先用球面 k-means 把向量分成 nlist 个簇, 每个簇的向量连续存放(倒排表);
+    查询时只在与查询最相近的 nprobe 个簇里做精确计算, nprobe 越大召回越高, 也越慢。
+持久化在 索引每一代的目录下的 ivf/ 下, 与 index_store 的矩阵一样以只读内存映射加载:
+    centroids.npy  (nlist, dim) 归一化的簇中心
+    vectors.npy    (n, dim) 按簇重排后的向量
+    rows.npy       (n,) 每个向量在 index_store 里的行号
+    offsets.npy    (nlist + 1,) 第 i 个簇是 vectors[offsets[i]:offsets[i + 1]]
+add() 插入的向量先放在内存里并参与检索, save() 时合并进倒排表。
+
+从已持久化的索引构建:
+    python -m examples.ivf_index build --nlist 64
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import NodeWithScore
+
+from .index_store import INDEX_DIR, MmapVectorRetriever, PersistedIndex, top_k
+
+NPROBE = 8
+
+
+def default_nlist(n: int) -> int:
+    return max(1, min(n, int(4 * np.sqrt(n))))
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    """每个向量最近的簇, 分块计算避免 (n, nlist) 的分数矩阵过大"""
+    res = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk):
+        res[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+    return res
+
+
+def kmeans(vectors: np.ndarray, nlist: int, iters: int = 10, seed: int = 0, max_train: int = 256) -> np.ndarray:
+    """球面 k-means, 只在最多 nlist * max_train 个采样点上训练"""
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample = np.asarray(vectors[np.sort(rng.choice(n, min(n, nlist * max_train), replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iters):
+        labels = assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        empty = np.bincount(labels, minlength=nlist) == 0
+        # 空簇重新随机取一个点
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+class IVFFlatIndex:
+    def __init__(self, centroids: np.ndarray, vectors: np.ndarray, rows: np.ndarray, offsets: np.ndarray):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.rows = rows
+        self.offsets = offsets
+        dim = centroids.shape[1]
+        self._pending_vectors = np.empty((0, dim), dtype=np.float32)
+        self._pending_rows = np.empty(0, dtype=np.int64)
+        self._pending_lists = np.empty(0, dtype=np.int32)
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    def __len__(self) -> int:
+        return len(self.rows) + len(self._pending_rows)
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, nlist: int | None = None, iters: int = 10, seed: int = 0) -> "IVFFlatIndex":
+        """embeddings 为已归一化的矩阵, 第 i 行的行号就是 i"""
+        nlist = nlist or default_nlist(len(embeddings))
+        centroids = kmeans(embeddings, nlist, iters, seed)
+        return cls._from_lists(centroids, np.asarray(embeddings, dtype=np.float32), np.arange(len(embeddings)))
+
+    @classmethod
+    def _from_lists(cls, centroids: np.ndarray, vectors: np.ndarray, rows: np.ndarray) -> "IVFFlatIndex":
+        labels = assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable")
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=len(centroids)), out=offsets[1:])
+        return cls(centroids, vectors[order], rows[order].astype(np.int64), offsets)
+
+    def reassign(self, embeddings: np.ndarray) -> "IVFFlatIndex":
+        """索引重写后行号会变, 沿用现有簇中心把 embeddings 重新分到各簇, 不重新训练"""
+        return self._from_lists(self.centroids, np.asarray(embeddings, dtype=np.float32), np.arange(len(embeddings)))
+
+    def add(self, vectors: np.ndarray, rows: np.ndarray):
+        """增量插入已归一化的向量, rows 为它们在 index_store 里的行号; 不重新训练簇中心"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        self._pending_vectors = np.concatenate([self._pending_vectors, vectors])
+        self._pending_rows = np.concatenate([self._pending_rows, np.asarray(rows, dtype=np.int64)])
+        self._pending_lists = np.concatenate([self._pending_lists, assign(vectors, self.centroids)])
+
+    def search(
+        self, query: np.ndarray, k: int, nprobe: int = NPROBE, mask: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """返回 (行号, 分数), 与 index_store.top_k 的约定相同"""
+        probe, _ = top_k(self.centroids, query, nprobe)
+        parts = [slice(self.offsets[i], self.offsets[i + 1]) for i in probe]
+        pending = np.isin(self._pending_lists, probe)
+        rows = np.concatenate([self.rows[s] for s in parts] + [self._pending_rows[pending]])
+        vectors = np.concatenate([self.vectors[s] for s in parts] + [self._pending_vectors[pending]])
+        if mask is not None:
+            keep = mask[rows]
+            rows, vectors = rows[keep], vectors[keep]
+        hits, scores = top_k(vectors, query, k)
+        return rows[hits], scores
+
+    def save(self, path: str):
+        """把内存里插入的向量合并进倒排表后写到 path(索引一代的目录)下"""
+        if len(self._pending_rows):
+            merged = self._from_lists(
+                self.centroids,
+                np.concatenate([np.asarray(self.vectors), self._pending_vectors]),
+                np.concatenate([np.asarray(self.rows), self._pending_rows]),
+            )
+            self.__init__(merged.centroids, merged.vectors, merged.rows, merged.offsets)
+        ivf_dir = os.path.join(path, "ivf")
+        os.makedirs(ivf_dir, exist_ok=True)
+        meta_path = os.path.join(ivf_dir, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for name in ("centroids", "vectors", "rows", "offsets"):
+            tmp = os.path.join(ivf_dir, f"{name}.npy.tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, getattr(self, name))
+            os.replace(tmp, os.path.join(ivf_dir, f"{name}.npy"))
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"count": len(self.rows), "nlist": self.nlist}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFFlatIndex":
+        ivf_dir = os.path.join(path, "ivf")
+        arrays = {
+            name: np.load(os.path.join(ivf_dir, f"{name}.npy"), mmap_mode="r")
+            for name in ("centroids", "vectors", "rows", "offsets")
+        }
+        return cls(**arrays)
+
+
+def ivf_exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, "ivf", "meta.json"))
+
+
+class IVFVectorRetriever(MmapVectorRetriever):
+    """与 MmapVectorRetriever 相同, 但只在 nprobe 个最近的簇里检索"""
+
+    def __init__(
+        self, index: PersistedIndex, ivf: IVFFlatIndex, embed_model: BaseEmbedding, nprobe: int = NPROBE, **kwargs
+    ):
+        self._ivf = ivf
+        self._nprobe = nprobe
+        super().__init__(index, embed_model, **kwargs)
+
+    def _top_k(self, query: np.ndarray) -> list[NodeWithScore]:
+        mask = self._index.metadata_mask(self._filters)
+        rows, scores = self._ivf.search(query, self._similarity_top_k, self._nprobe, mask)
+        return [NodeWithScore(node=self._index.get_node(int(row)), score=float(score)) for row, score in zip(rows, scores)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the IVF-flat index over the persisted grape docs index")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    parser.add_argument("--nlist", type=int, default=None, help="number of clusters, default 4 * sqrt(n)")
+    parser.add_argument("--iters", type=int, default=10)
+    args = parser.parse_args()
+
+    index = PersistedIndex(args.index_dir)
+    ivf = IVFFlatIndex.build(index.embeddings, args.nlist, args.iters)
+    # 加到当前这一代里, 之后的导入沿用它的簇中心
+    ivf.save(index.path)
+    print(f"✅ saved IVF index with {ivf.nlist} lists over {len(ivf)} vectors to {index.path}/ivf")
@@ -0,0 +1,253 @@
+"""
+BM25 倒排索引, 病害名、品种名这类精确词的查询不需要嵌入服务也能命中:
+    中文按字的二元组切分(白粉病 -> 白粉 粉病), 英文和数字按词, 不依赖分词词典;
+    倒排表以 CSR 数组形式存在 索引每一代的目录下的 bm25/ 下, 与向量矩阵一样以只读内存映射加载。
+FusionRetriever 把 BM25 和向量检索的结果按倒数排名融合(RRF); 词匹配足够确定时直接返回 BM25 结果, 不调用嵌入服务。
+"""
+import json
+import os
+import re
+import shutil
+import uuid
+from collections import Counter
+from collections.abc import Sequence
+
+import numpy as np
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+from .index_store import PersistedIndex
+
+K1 = 1.5
+B = 0.75
+# 排名第一的文档覆盖了查询中多少比例的 idf 权重, 达到该值视为词匹配足够确定
+MIN_CONFIDENCE = 0.7
+# RRF 的平滑常数, 1 / (RRF_K + rank)
+RRF_K = 60
+
+_TOKEN_RE = re.compile(r"[\u4e00-\u9fff]+|[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if run.isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index:
+    def __init__(
+        self,
+        vocab: list[str],
+        offsets: np.ndarray,
+        postings: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+        k1: float = K1,
+        b: float = B,
+    ):
+        self.vocab = {term: i for i, term in enumerate(vocab)}
+        self.offsets = offsets
+        self.postings = postings
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        n = len(doc_len)
+        self.avgdl = float(doc_len.mean()) if n else 0.0
+        df = np.diff(offsets)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    @classmethod
+    def build(cls, texts: Sequence[str]) -> "BM25Index":
+        """第 i 篇文本对应 index_store 的第 i 行"""
+        postings: dict[str, list[tuple[int, int]]] = {}
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_len[row] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append((row, tf))
+        vocab = sorted(postings)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum([len(postings[term]) for term in vocab], out=offsets[1:])
+        pairs = np.array([pair for term in vocab for pair in postings[term]], dtype=np.int64).reshape(-1, 2)
+        return cls(vocab, offsets, pairs[:, 0].astype(np.int32), pairs[:, 1].astype(np.float32), doc_len)
+
+    def _term_ids(self, query: str) -> list[int]:
+        return sorted({self.vocab[t] for t in tokenize(query) if t in self.vocab})
+
+    def search(self, query: str, k: int, mask: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """返回 BM25 分数最高的 k 行的 (行号, 分数), 不含任何查询词的行不返回"""
+        docs, contribs = [], []
+        for t in self._term_ids(query):
+            rows = self.postings[self.offsets[t]:self.offsets[t + 1]]
+            tf = self.tfs[self.offsets[t]:self.offsets[t + 1]]
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[rows] / self.avgdl)
+            docs.append(rows)
+            contribs.append(self.idf[t] * tf * (self.k1 + 1) / (tf + norm))
+        if not docs:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(contribs)).astype(np.float32)
+        if mask is not None:
+            keep = mask[rows]
+            rows, scores = rows[keep], scores[keep]
+        order = np.argsort(-scores, kind="stable")[:k]
+        return rows[order].astype(np.int64), scores[order]
+
+    def confidence(self, query: str, row: int) -> float:
+        """
+        row 覆盖的查询 idf 权重占比。词表里没有的词按没有出现过的词的 idf 计入分母: 否则 "特斯拉股价葡萄" 这类
+        只有一个常见词在词表里的查询也会算作完全匹配; 跨词边界切出来的二元组(葡萄怎么样 -> 萄怎)也因此拉低置信度,
+        这类查询交给融合检索。分母至少取一个没有出现过的词的 idf, "葡萄" 这类只含常见词的查询信息太少, 也不算确定。
+        查询没有任何词时为 0。
+        """
+        terms = set(tokenize(query))
+        oov = sum(t not in self.vocab for t in terms)
+        unseen_idf = float(np.log1p((len(self) + 0.5) / 0.5))
+        total, matched = oov * unseen_idf, 0.0
+        for t in self._term_ids(query):
+            total += self.idf[t]
+            rows = self.postings[self.offsets[t]:self.offsets[t + 1]]
+            i = np.searchsorted(rows, row)
+            if i < len(rows) and rows[i] == row:
+                matched += self.idf[t]
+        return float(matched / max(total, unseen_idf)) if terms else 0.0
+
+    def save(self, path: str):
+        """
+        path 为索引一代的目录(IndexWriter.path / PersistedIndex.path)。先写到旁边名字唯一的临时目录, 写完整后改名为 bm25/,
+        多个进程同时保存也不会互相覆盖; 已经有完整的 bm25/ 时(其他进程先写好了)保留已有的。
+        """
+        bm25_dir = os.path.join(path, "bm25")
+        tmp_dir = f"{bm25_dir}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_dir)
+        try:
+            for name in ("offsets", "postings", "tfs", "doc_len"):
+                with open(os.path.join(tmp_dir, f"{name}.npy"), "wb") as f:
+                    np.save(f, getattr(self, name))
+            with open(os.path.join(tmp_dir, "vocab.json"), "w", encoding="utf-8") as f:
+                json.dump(sorted(self.vocab, key=self.vocab.get), f, ensure_ascii=False)
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({"count": len(self), "k1": self.k1, "b": self.b}, f)
+            if os.path.exists(bm25_dir) and not bm25_exists(path):
+                # 旧版本就地写了一半留下的
+                shutil.rmtree(bm25_dir)
+            try:
+                os.rename(tmp_dir, bm25_dir)
+            except OSError:
+                if not bm25_exists(path):
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        bm25_dir = os.path.join(path, "bm25")
+        with open(os.path.join(bm25_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(bm25_dir, "vocab.json"), encoding="utf-8") as f:
+            vocab = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(bm25_dir, f"{name}.npy"), mmap_mode="r")
+            for name in ("offsets", "postings", "tfs", "doc_len")
+        }
+        return cls(vocab, **arrays, k1=meta["k1"], b=meta["b"])
+
+
+def bm25_exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, "bm25", "meta.json"))
+
+
+class LexicalRetriever(BaseRetriever):
+    """只用 BM25 检索"""
+
+    def __init__(self, index: PersistedIndex, bm25: BM25Index, similarity_top_k: int = 3, **kwargs):
+        self._index = index
+        self._bm25 = bm25
+        self._similarity_top_k = similarity_top_k
+        super().__init__(**kwargs)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        rows, scores = self._bm25.search(query_bundle.query_str, self._similarity_top_k)
+        return [NodeWithScore(node=self._index.get_node(int(row)), score=float(score)) for row, score in zip(rows, scores)]
+
+
+class FusionRetriever(BaseRetriever):
+    """
+    BM25 与向量检索按 RRF 融合。vector_retriever 的 similarity_top_k 决定参与融合的候选数,
+    应不小于 similarity_top_k; BM25 第一名的置信度达到 min_confidence 时直接返回 BM25 结果。
+    """
+
+    def __init__(
+        self,
+        index: PersistedIndex,
+        bm25: BM25Index,
+        vector_retriever: BaseRetriever,
+        similarity_top_k: int = 3,
+        num_candidates: int = 10,
+        min_confidence: float = MIN_CONFIDENCE,
+        rrf_k: int = RRF_K,
+        **kwargs,
+    ):
+        self._index = index
+        self._bm25 = bm25
+        self._vector_retriever = vector_retriever
+        self._similarity_top_k = similarity_top_k
+        self._num_candidates = num_candidates
+        self._min_confidence = min_confidence
+        self._rrf_k = rrf_k
+        super().__init__(**kwargs)
+
+    def _lexical(self, query: str) -> tuple[list[tuple[int, float]], bool]:
+        """BM25 候选的 (行号, 分数); 这里不取节点, 只有最终返回的行才调用 get_node"""
+        rows, scores = self._bm25.search(query, max(self._num_candidates, self._similarity_top_k))
+        hits = [(int(row), float(score)) for row, score in zip(rows, scores)]
+        confident = (
+            len(hits) >= self._similarity_top_k
+            and self._bm25.confidence(query, hits[0][0]) >= self._min_confidence
+        )
+        return hits, confident
+
+    def _nodes(self, hits: list[tuple[int, float]]) -> list[NodeWithScore]:
+        return [NodeWithScore(node=self._index.get_node(row), score=score) for row, score in hits]
+
+    def _fuse(self, lexical: list[tuple[int, float]], vector: list[NodeWithScore]) -> list[NodeWithScore]:
+        # 按 node id 累加 RRF 分数; 向量检索的结果已经带着节点, BM25 的候选进入前 similarity_top_k 时才取节点
+        scores: dict[str, float] = {}
+        sources: dict[str, int | NodeWithScore] = {}
+        for rank, (row, _) in enumerate(lexical):
+            node_id = self._index.node_ids[row]
+            scores[node_id] = scores.get(node_id, 0.0) + 1 / (self._rrf_k + rank + 1)
+            sources[node_id] = row
+        for rank, node in enumerate(vector):
+            node_id = node.node.node_id
+            scores[node_id] = scores.get(node_id, 0.0) + 1 / (self._rrf_k + rank + 1)
+            sources[node_id] = node
+        top = sorted(scores, key=scores.get, reverse=True)[: self._similarity_top_k]
+        return [
+            NodeWithScore(
+                node=sources[i].node if isinstance(sources[i], NodeWithScore) else self._index.get_node(sources[i]),
+                score=scores[i],
+            )
+            for i in top
+        ]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        lexical, confident = self._lexical(query_bundle.query_str)
+        if confident:
+            return self._nodes(lexical[: self._similarity_top_k])
+        return self._fuse(lexical, self._vector_retriever.retrieve(query_bundle))
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        lexical, confident = self._lexical(query_bundle.query_str)
+        if confident:
+            return self._nodes(lexical[: self._similarity_top_k])
+        return self._fuse(lexical, await self._vector_retriever.aretrieve(query_bundle))
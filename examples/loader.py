@@ -1,27 +1,24 @@
 from llama_index.core import Settings, SimpleDirectoryReader
-from llama_index.core.ingestion import IngestionPipeline
-from llama_index.core.node_parser import MarkdownNodeParser
+from llama_index.core.schema import BaseNode
 
-from .custom_embedding import CustomEmbedding
+from .ingest import DATA_DIR, PIPELINE_DIR, make_embed_model, make_pipeline
 
 # from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 
 # embed_model = HuggingFaceEmbedding(model_name="./embedding_models/text2vec-base-chinese")
 
-embed_model = CustomEmbedding()
-Settings.embed_model = embed_model
-docs = SimpleDirectoryReader(input_dir="./data").load_data()
 
+def load_nodes(data_dir: str = DATA_DIR) -> list[BaseNode]:
+    """
+    全量跑一遍 ingestion, 返回带向量的节点; 需要嵌入服务, 耗时与数据量成正比, 不要在导入或服务启动时调用。
+    持久化索引用 python -m examples.index_store build 构建, 只同步改动过的文件用 python -m examples.ingest
+    """
+    embed_model = make_embed_model()
+    Settings.embed_model = embed_model
+    docs = SimpleDirectoryReader(input_dir=data_dir, filename_as_id=True).load_data()
 
-pipeline = IngestionPipeline(
-    transformations=[
-        MarkdownNodeParser(),
-        embed_model
-    ],
-)
-
-pipeline.load('./cache/pipeline_storage')
-
-nodes = pipeline.run(documents=docs, show_progress=True)
-pipeline.persist("./cache/pipeline_storage")
+    pipeline = make_pipeline(embed_model)
 
+    nodes = pipeline.run(documents=docs, show_progress=True)
+    pipeline.persist(PIPELINE_DIR)
+    return nodes
@@ -0,0 +1,165 @@
+"""
+列式的节点存储, 代替 SimpleDocumentStore(每个节点常驻一个完整的 TextNode, 带 metadata 字典和 relationships):
+    <index_dir>/nodes/text.bin      所有节点的正文按行号顺序拼接, UTF-8
+    <index_dir>/nodes/offsets.npy   (n + 1,) int64, 第 i 行的正文是 text.bin[offsets[i]:offsets[i + 1]]
+    <index_dir>/nodes/col_<j>.npy   (n,) int32, 第 j 列的字典编码, -1 表示这一行没有该字段
+    <index_dir>/nodes/columns.json  [[列名, 取值表], ...]
+列包括每个 metadata 字段(file_path、header_path...)、ref_doc_id 和 excluded_embed/llm_metadata_keys,
+同一文件的节点大多取值相同, 字典编码后每行每列只占 4 字节。
+正文和各列都以只读内存映射打开, 多个 worker 共享页缓存里的同一份; 只有检索命中的行才由 get_node() 组装成 TextNode。
+节点之间的 PREVIOUS/NEXT 关系和字符位置不保存, 检索和 get_grape_docs 用不到。
+"""
+import json
+import os
+from collections.abc import Sequence
+
+import numpy as np
+from llama_index.core.schema import BaseNode, NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+
+METADATA_PREFIX = "metadata."
+# 这几个字段是列表, 按 JSON 字符串编码
+LIST_FIELDS = ("excluded_embed_metadata_keys", "excluded_llm_metadata_keys")
+
+
+def _fields(node: BaseNode) -> dict:
+    # 取值为 None 与没有这个字段一样处理, 编码为 -1
+    fields = {METADATA_PREFIX + k: v for k, v in node.metadata.items() if v is not None}
+    if node.ref_doc_id is not None:
+        fields["ref_doc_id"] = node.ref_doc_id
+    for name in LIST_FIELDS:
+        fields[name] = json.dumps(getattr(node, name))
+    return fields
+
+
+class NodeStoreWriter:
+    """正文边 add() 边写入临时文件, 各列的编码在内存里攒着, close() 时写盘"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._text = open(os.path.join(path, "text.bin.tmp"), "wb")
+        self._offsets = [0]
+        # 列名 -> (取值的 JSON -> 编码, 取值表, 每行的编码)
+        self._columns: dict[str, tuple[dict[str, int], list, list[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def add(self, nodes: Sequence[BaseNode]):
+        for node in nodes:
+            data = node.get_content().encode("utf-8")
+            self._text.write(data)
+            self._offsets.append(self._offsets[-1] + len(data))
+            row = len(self) - 1
+            for name, value in _fields(node).items():
+                if name not in self._columns:
+                    self._columns[name] = ({}, [], [-1] * row)
+                index, values, codes = self._columns[name]
+                # 取值可能是列表等不可哈希的类型, 按 JSON 去重
+                key = json.dumps(value, ensure_ascii=False, sort_keys=True)
+                if key not in index:
+                    index[key] = len(values)
+                    values.append(value)
+                codes.append(index[key])
+            for _, _, codes in self._columns.values():
+                if len(codes) == row:
+                    codes.append(-1)
+
+    def abort(self):
+        """只关闭临时文件, 目录由调用方删除"""
+        self._text.close()
+
+    def close(self):
+        self._text.close()
+        os.replace(os.path.join(self.path, "text.bin.tmp"), os.path.join(self.path, "text.bin"))
+        arrays = {"offsets": np.asarray(self._offsets, dtype=np.int64)}
+        for j, (_, _, codes) in enumerate(self._columns.values()):
+            arrays[f"col_{j}"] = np.asarray(codes, dtype=np.int32)
+        for name, array in arrays.items():
+            tmp = os.path.join(self.path, f"{name}.npy.tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, os.path.join(self.path, f"{name}.npy"))
+        tmp = os.path.join(self.path, "columns.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump([[name, values] for name, (_, values, _) in self._columns.items()], f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(self.path, "columns.json"))
+
+
+class NodeStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.offsets: np.ndarray = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        # 长度为 0 的文件不能映射
+        text_path = os.path.join(path, "text.bin")
+        self.text_blob = np.memmap(text_path, dtype=np.uint8, mode="r") if os.path.getsize(text_path) else np.empty(0, np.uint8)
+        with open(os.path.join(path, "columns.json"), encoding="utf-8") as f:
+            columns = json.load(f)
+        # 列名 -> (每行的编码, 取值表)
+        self.columns: dict[str, tuple[np.ndarray, list]] = {
+            name: (np.load(os.path.join(path, f"col_{j}.npy"), mmap_mode="r"), values)
+            for j, (name, values) in enumerate(columns)
+        }
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def text(self, row: int) -> str:
+        return self.text_blob[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+    def _value(self, name: str, row: int):
+        codes, values = self.columns[name]
+        code = int(codes[row])
+        return values[code] if code >= 0 else None
+
+    def metadata_column(self, key: str) -> tuple[np.ndarray, dict]:
+        """(每行的编码, 取值 -> 编码), 与 PersistedIndex 的过滤列约定相同"""
+        if METADATA_PREFIX + key not in self.columns:
+            return np.full(len(self), -1, dtype=np.int32), {}
+        codes, values = self.columns[METADATA_PREFIX + key]
+        return np.asarray(codes), {v: i for i, v in enumerate(values) if not isinstance(v, (list, dict))}
+
+    def get_node(self, row: int, node_id: str) -> TextNode:
+        metadata = {}
+        for name, (codes, values) in self.columns.items():
+            if name.startswith(METADATA_PREFIX) and codes[row] >= 0:
+                metadata[name[len(METADATA_PREFIX):]] = values[codes[row]]
+        ref_doc_id = self._value("ref_doc_id", row) if "ref_doc_id" in self.columns else None
+        return TextNode(
+            id_=node_id,
+            text=self.text(row),
+            metadata=metadata,
+            relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=ref_doc_id)} if ref_doc_id else {},
+            **{
+                name: json.loads(value)
+                for name in LIST_FIELDS
+                if name in self.columns and (value := self._value(name, row)) is not None
+            },
+        )
+
+
+class DocstoreNodes:
+    """格式 1 的索引(docstore.json)套上与 NodeStore 相同的接口, 整份 docstore 常驻内存"""
+
+    def __init__(self, path: str, node_ids: list[str]):
+        self.docstore = SimpleDocumentStore.from_persist_path(path)
+        self.node_ids = node_ids
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def text(self, row: int) -> str:
+        return self.docstore.get_node(self.node_ids[row]).get_content()
+
+    def metadata_column(self, key: str) -> tuple[np.ndarray, dict]:
+        vocab: dict = {}
+        codes = np.full(len(self), -1, dtype=np.int32)
+        for row, node_id in enumerate(self.node_ids):
+            value = self.docstore.get_node(node_id).metadata.get(key)
+            if value is not None:
+                codes[row] = vocab.setdefault(value, len(vocab))
+        return codes, vocab
+
+    def get_node(self, row: int, node_id: str) -> BaseNode:
+        return self.docstore.get_node(node_id)
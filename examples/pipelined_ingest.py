@@ -0,0 +1,146 @@
+"""
+流水线导入, 三个阶段同时进行, 代替 IngestionPipeline 的 读取 -> 解析 -> 嵌入 串行执行:
+    解析  读取文件和 MarkdownNodeParser 在 workers 个进程里跑, 每个任务处理 files_per_task 个文件;
+          默认留一个核给嵌入和写入, 只有一个核时 workers 为 0, 改在一个线程里解析(省掉子进程启动和节点序列化)
+    嵌入  解析出的节点攒够 embed_batch_size 条发一批, 由 CustomEmbedding 异步请求, 在途 RPC 不超过 max_concurrency
+    写入  嵌入完成的批次交给后台线程写进 IndexWriter, 与前两个阶段重叠
+已解析但还没写入的批次不超过 max_pending 个, 嵌入服务跟不上时解析自动放慢, 内存占用有上限。
+    python -m examples.ingest --pipelined --workers 4
+吞吐对比见 python -m examples.bench_ingest。
+"""
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from llama_index.core import SimpleDirectoryReader
+from llama_index.core.node_parser import MarkdownNodeParser
+from llama_index.core.schema import BaseNode
+
+from .custom_embedding import CustomEmbedding
+from .index_store import IndexWriter
+
+FILES_PER_TASK = 8
+# 每批节点走一次 GetTextEmbeddings, 与服务端单次前向计算的大小一致
+EMBED_BATCH_SIZE = 64
+MAX_PENDING = 8
+
+
+def parse_files(paths: list[str]) -> list[BaseNode]:
+    """在子进程里运行, 节点 id 和 metadata 与 IngestionPipeline 的结果一致(filename_as_id)"""
+    docs = SimpleDirectoryReader(input_files=paths, filename_as_id=True).load_data()
+    return MarkdownNodeParser().get_nodes_from_documents(docs)
+
+
+def default_workers() -> int:
+    return (os.cpu_count() or 1) - 1
+
+
+def make_executor(workers: int) -> Executor:
+    if workers <= 0:
+        return ThreadPoolExecutor(1, thread_name_prefix="parser")
+    # gRPC 不支持 fork, 解析进程用 spawn 启动
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _write_loop(batches: queue.Queue, writer: IndexWriter, errors: list[BaseException]):
+    while (nodes := batches.get()) is not None:
+        if errors:
+            # 写入已经失败, 只把队列取空, 避免生产者阻塞
+            continue
+        try:
+            writer.add(nodes)
+        except BaseException as e:
+            errors.append(e)
+
+
+async def run_pipeline(
+    paths: list[str],
+    embed_model: CustomEmbedding,
+    writer: IndexWriter,
+    workers: int | None = None,
+    files_per_task: int = FILES_PER_TASK,
+    max_pending: int = MAX_PENDING,
+) -> int:
+    """解析、嵌入 paths 并写入 writer(不调用 close), 返回节点数"""
+    loop = asyncio.get_running_loop()
+    workers = default_workers() if workers is None else workers
+    batch_size = embed_model.embed_batch_size
+    batches: queue.Queue = queue.Queue(maxsize=max_pending)
+    errors: list[BaseException] = []
+    write_thread = threading.Thread(target=_write_loop, args=(batches, writer, errors), name="index-writer", daemon=True)
+    write_thread.start()
+    pending = asyncio.Semaphore(max_pending)
+    embed_tasks: list[asyncio.Task] = []
+    count = 0
+
+    async def embed(nodes: list[BaseNode]):
+        try:
+            nodes = await embed_model.acall(nodes)
+            await loop.run_in_executor(None, batches.put, nodes)
+        finally:
+            pending.release()
+
+    async def dispatch(nodes: list[BaseNode]):
+        nonlocal count
+        await pending.acquire()
+        # 之前的批次嵌入或写入失败时尽早停下, 不再继续解析
+        failed = [t.exception() for t in embed_tasks if t.done() and t.exception()] + errors
+        if failed:
+            pending.release()
+            raise failed[0]
+        count += len(nodes)
+        embed_tasks.append(asyncio.create_task(embed(nodes)))
+
+    groups = iter([paths[i:i + files_per_task] for i in range(0, len(paths), files_per_task)])
+    buffer: list[BaseNode] = []
+    try:
+        with make_executor(workers) as pool:
+            parsing: set[asyncio.Future] = set()
+            while True:
+                while len(parsing) < max(workers, 1) * 2 and (group := next(groups, None)) is not None:
+                    parsing.add(loop.run_in_executor(pool, parse_files, group))
+                if not parsing:
+                    break
+                done, parsing = await asyncio.wait(parsing, return_when=asyncio.FIRST_COMPLETED)
+                for fut in done:
+                    buffer.extend(fut.result())
+                while len(buffer) >= batch_size:
+                    await dispatch(buffer[:batch_size])
+                    buffer = buffer[batch_size:]
+        if buffer:
+            await dispatch(buffer)
+        await asyncio.gather(*embed_tasks)
+    finally:
+        for task in embed_tasks:
+            task.cancel()
+        await loop.run_in_executor(None, batches.put, None)
+        await loop.run_in_executor(None, write_thread.join)
+    if errors:
+        raise errors[0]
+    return count
+
+
+def ingest_files(
+    paths: list[str],
+    index_dir: str,
+    embed_model: CustomEmbedding,
+    nodes: list[BaseNode] | None = None,
+    manifest: dict[str, str] | None = None,
+    **kwargs,
+) -> int:
+    """
+    把已有的 nodes 和 paths 解析嵌入后的节点一起写成新的一代索引, 返回索引节点数; kwargs 见 run_pipeline。
+    中途失败时正在使用的索引不变。
+    """
+    writer = IndexWriter(index_dir, manifest)
+    try:
+        writer.add(nodes or [])
+        asyncio.run(run_pipeline(paths, embed_model, writer, **kwargs))
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    return len(writer)
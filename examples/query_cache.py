@@ -0,0 +1,70 @@
+"""
+get_grape_docs 的两级缓存:
+    一级  归一化后的查询 -> 查询向量, 与索引无关, 索引重建后仍然有效
+    二级  (归一化查询, 检索方式, top_k, 索引版本) -> 格式化好的检索结果, 索引版本变化后自动失效
+两级都是带 TTL 的 LRU, 同一个 ReAct 循环里或不同会话间重复的查询不再重复嵌入和检索。
+"""
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any
+
+_SPACE_RE = re.compile(r"\s+")
+# 查询末尾不影响语义的标点
+_TRAILING_PUNCT = "?？!！。.,，;；~"
+
+
+def normalize_query(query: str) -> str:
+    """全角转半角、小写、合并空白、去掉首尾空白和末尾问号等标点"""
+    query = unicodedata.normalize("NFKC", query).lower()
+    return _SPACE_RE.sub(" ", query).strip().rstrip(_TRAILING_PUNCT).strip()
+
+
+class TTLCache:
+    def __init__(self, max_entries: int = 1024, ttl: float | None = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or (self.ttl is not None and item[0] < time.monotonic()):
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
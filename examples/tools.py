@@ -15,7 +15,18 @@ from .coze_llm import (
     chat_no_stream,
     coze,
 )
-from .vector_store_index import retriever as grape_retriever
+from .context_packer import TOKEN_BUDGET, ContextPacker, format_doc
+from .query_cache import TTLCache, normalize_query
+from .vector_store_index import SIMILARITY_TOP_K, refresh_index
+
+# get_grape_docs 的检索方式: vector 只用向量, lexical 只用 BM25,
+# fusion 两者按 RRF 融合, 词匹配足够确定时不调用嵌入服务
+GRAPE_DOCS_MODE: Literal["vector", "lexical", "fusion"] = "fusion"
+# 检索结果按 token 预算打包(分数截断、去重、超出预算时先裁掉不相关的句子), None 表示照旧返回前 SIMILARITY_TOP_K 个块的全文
+GRAPE_DOCS_TOKEN_BUDGET: int | None = TOKEN_BUDGET
+# (归一化查询, 检索方式, top_k, token 预算, 索引版本) -> 格式化后的结果; 索引版本变化时清空
+grape_docs_cache = TTLCache(max_entries=512, ttl=30 * 60)
+_grape_docs_cache_version: str | None = None
 
 
 class ToolResponse(BaseModel):
@@ -51,24 +62,27 @@ def json_response(format: Literal["json", "text", "markdown"]):
 @json_response(format='markdown')
 def get_grape_docs(query: str) -> list[str]:
     """Get grape docs."""
-    res = []
-    node_with_scores: list[NodeWithScore] = grape_retriever.retrieve(query)
-    for node_s in node_with_scores:
-        node = node_s.node  # 获取内部 node
-        text = getattr(node, "text", "") or getattr(node, "get_text", lambda: "")()
-        metadata = getattr(node, "metadata", {})
-
-        # 只保留感兴趣的字段
-        useful_metadata_keys = ["file_path", "header_path"]
-        useful_metadata = {k: v for k, v in metadata.items() if k in useful_metadata_keys}
-
-        node_str = "📁 Metadata:\n"
-        for k, v in useful_metadata.items():
-            node_str += f"- {k}: {v}\n"
-
-        node_str += "📝 Text:\n" + text
-        res.append(node_str)
-    return '\n---\n'.join(res)
+    global _grape_docs_cache_version
+    # 索引在第一次检索时才加载, 增量导入写出新的一代后换成新的
+    grape = refresh_index()
+    if grape.index.version != _grape_docs_cache_version:
+        grape_docs_cache.clear()
+        _grape_docs_cache_version = grape.index.version
+    key = (normalize_query(query), GRAPE_DOCS_MODE, SIMILARITY_TOP_K, GRAPE_DOCS_TOKEN_BUDGET, grape.index.version)
+    cached = grape_docs_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if GRAPE_DOCS_TOKEN_BUDGET is None:
+        node_with_scores: list[NodeWithScore] = grape.retrievers[GRAPE_DOCS_MODE].retrieve(query)
+        res = [format_doc(node_s.node.metadata, node_s.node.get_content()) for node_s in node_with_scores]
+    else:
+        node_with_scores = grape.candidate_retrievers[GRAPE_DOCS_MODE].retrieve(query)
+        packer = ContextPacker(grape.bm25, token_budget=GRAPE_DOCS_TOKEN_BUDGET)
+        res = [format_doc(chunk.node.node.metadata, chunk.text) for chunk in packer.pack(query, node_with_scores)]
+    docs = '\n---\n'.join(res)
+    grape_docs_cache.put(key, docs)
+    return docs
 
 @json_response(format="text")
 def get_now_local_datetime() -> str:
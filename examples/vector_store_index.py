@@ -1,17 +1,127 @@
-from llama_index.core import VectorStoreIndex
-from llama_index.core.retrievers import VectorIndexRetriever
+"""
+grape docs 的检索入口。导入本模块不读取数据、不跑 ingestion, 也不加载索引:
+索引由 python -m examples.index_store build 预先构建, 第一次检索时(或服务的 lifespan 里)由 load_grape_index() 加载,
+只是内存映射几个文件, 冷启动在秒级; 索引不存在时报错并提示构建命令, 不会在服务进程里现场导入。
+"""
+import threading
+import time
 
-from .loader import nodes
+from llama_index.core.retrievers import BaseRetriever
 
-index = VectorStoreIndex(nodes)
+from .custom_embedding import CustomEmbedding
+from .index_store import INDEX_DIR, MmapVectorRetriever, PersistedIndex
+from .ivf_index import IVFFlatIndex, IVFVectorRetriever, ivf_exists
+from .lexical_index import BM25Index, FusionRetriever, LexicalRetriever, bm25_exists
+from .query_cache import TTLCache
 
-# retriever = index.as_retriever()
-# nodes = retriever.retrieve("葡萄白粉病")
-# configure retriever
-retriever = VectorIndexRetriever(
-    index=index,
-    similarity_top_k=3,
-)
+# 知识库较大时改用 IVF 近似检索(需要先 python -m examples.ivf_index build), 小语料用精确检索即可
+USE_ANN = False
+SIMILARITY_TOP_K = 3
+# 融合检索时向量检索和 BM25 各取多少个候选
+FUSION_CANDIDATES = 10
+# 按 token 预算打包检索结果(context_packer)时的候选数, 最终留下几个由分数截断和预算决定
+CONTEXT_CANDIDATES = 6
 
+embed_model = CustomEmbedding()
+# 查询向量只取决于查询文本和嵌入模型, 索引重建不影响, 所有向量检索共用
+query_embedding_cache = TTLCache(max_entries=4096, ttl=24 * 3600)
 
-# nodes = retriever.retrieve("什么时候浇水")
+
+class GrapeIndex:
+    """持久化的索引及其 BM25 / IVF 部分, 以及建在它们上面的各个 retriever"""
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.index = PersistedIndex(index_dir)
+        # BM25 / IVF 取自同一代; 旧版本保存的索引没有 BM25 部分, 先在内存里用已保存的正文建一份,
+        # 不写入正在使用的这一代, 由 python -m examples.ingest 补建到磁盘上
+        path = self.index.path
+        if bm25_exists(path):
+            self.bm25 = BM25Index.load(path)
+        else:
+            print(
+                f"⚠️ grape docs index {self.index.version} has no BM25 index, "
+                "run `python -m examples.ingest` to add it"
+            )
+            self.bm25 = BM25Index.build([self.index.text(row) for row in range(len(self.index))])
+        self.ivf = IVFFlatIndex.load(path) if USE_ANN and ivf_exists(path) else None
+        self.retrievers = self.make_retrievers(SIMILARITY_TOP_K)
+        self.candidate_retrievers = self.make_retrievers(CONTEXT_CANDIDATES)
+
+    def make_retrievers(self, similarity_top_k: int) -> dict[str, BaseRetriever]:
+        num_candidates = max(FUSION_CANDIDATES, similarity_top_k)
+        return {
+            "vector": self.make_vector_retriever(similarity_top_k),
+            "lexical": LexicalRetriever(index=self.index, bm25=self.bm25, similarity_top_k=similarity_top_k),
+            "fusion": FusionRetriever(
+                index=self.index,
+                bm25=self.bm25,
+                vector_retriever=self.make_vector_retriever(num_candidates),
+                similarity_top_k=similarity_top_k,
+                num_candidates=num_candidates,
+            ),
+        }
+
+    def make_vector_retriever(self, similarity_top_k: int = SIMILARITY_TOP_K) -> MmapVectorRetriever:
+        if self.ivf is not None:
+            return IVFVectorRetriever(
+                index=self.index,
+                ivf=self.ivf,
+                embed_model=embed_model,
+                similarity_top_k=similarity_top_k,
+                query_cache=query_embedding_cache,
+            )
+        return MmapVectorRetriever(
+            index=self.index,
+            embed_model=embed_model,
+            similarity_top_k=similarity_top_k,
+            query_cache=query_embedding_cache,
+        )
+
+
+_grape_index: GrapeIndex | None = None
+_grape_index_lock = threading.Lock()
+
+
+def load_grape_index() -> GrapeIndex:
+    """第一次调用时加载, 之后返回同一个对象; 多个线程同时第一次调用时只加载一次"""
+    global _grape_index
+    if _grape_index is None:
+        with _grape_index_lock:
+            if _grape_index is None:
+                start = time.perf_counter()
+                grape_index = GrapeIndex()
+                meta = grape_index.index.meta
+                print(
+                    f"✅ loaded grape docs index {grape_index.index.version} "
+                    f"({meta['count']} nodes, built {meta.get('created_at', 'unknown')}) "
+                    f"in {time.perf_counter() - start:.2f}s"
+                )
+                _grape_index = grape_index
+    return _grape_index
+
+
+def refresh_index() -> GrapeIndex:
+    """
+    增量导入写出新的一代后, 在旁边完整加载一个新的 GrapeIndex 再替换, 正在用旧对象的检索不受影响;
+    加载失败时继续用原来的, 下一次调用再试。返回当前的 GrapeIndex。
+    """
+    global _grape_index
+    grape_index = load_grape_index()
+    if not grape_index.index.is_stale():
+        return grape_index
+    with _grape_index_lock:
+        # 等锁的时候其他线程可能已经换好了
+        if _grape_index is not grape_index:
+            return _grape_index
+        start = time.perf_counter()
+        try:
+            new_index = GrapeIndex(grape_index.index.index_dir)
+        except Exception as e:
+            print(f"⚠️ failed to reload grape docs index, still using {grape_index.index.version}: {e!r}")
+            return grape_index
+        print(f"✅ reloaded grape docs index {new_index.index.version} in {time.perf_counter() - start:.2f}s")
+        _grape_index = new_index
+    return _grape_index
+
+
+# nodes = load_grape_index().retrievers["vector"].retrieve("什么时候浇水")
@@ -0,0 +1,102 @@
+"""
+嵌入模型的 CPU 推理后端:
+    torch      PyTorch eager, 原来的实现
+    onnx       导出的 ONNX 模型, 用 ONNX Runtime 推理
+    onnx-int8  在 onnx 基础上做动态 int8 量化
+
+onnx / onnx-int8 需要安装可选依赖 onnx(uv sync --extra onnx), 并先导出:
+    python -m grpc_embedding.backends export
+导出的文件放在模型目录的 onnx/ 下, 与 sentence-transformers 的约定一致。
+
+torch 后端优先加载 model.safetensors(按内存映射读取, 不需要先反序列化整份 pickle), 没有时可以转换一次:
+    python -m grpc_embedding.backends safetensors
+"""
+import argparse
+import os
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+MODEL_NAME = "./embedding_models/text2vec-base-chinese"
+# 动态量化的目标指令集, 可选 arm64 / avx2 / avx512 / avx512_vnni, 按部署机器的 CPU 选择
+INT8_CONFIG = "avx2"
+
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+
+
+def onnx_file_name(backend: str, int8_config: str = INT8_CONFIG) -> str:
+    if backend == "onnx":
+        return "onnx/model.onnx"
+    if backend == "onnx-int8":
+        return f"onnx/model_qint8_{int8_config}.onnx"
+    raise ValueError(f"{backend} is not an onnx backend")
+
+
+def has_safetensors(model_name: str = MODEL_NAME) -> bool:
+    return os.path.exists(os.path.join(model_name, "model.safetensors"))
+
+
+def load_embed_model(
+    backend: str = "torch",
+    model_name: str = MODEL_NAME,
+    embed_batch_size: int = 64,
+    int8_config: str = INT8_CONFIG,
+) -> "HuggingFaceEmbedding":
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    # 导入 torch / transformers 本身就要几秒, 放到真正加载模型时再做, 调用方可以先把端口绑上
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
+    if backend == "torch":
+        if not has_safetensors(model_name):
+            print(f"⚠️ {model_name} has no model.safetensors, run `python -m grpc_embedding.backends safetensors`")
+            return HuggingFaceEmbedding(model_name=model_name, embed_batch_size=embed_batch_size)
+        return HuggingFaceEmbedding(
+            model_name=model_name,
+            embed_batch_size=embed_batch_size,
+            model_kwargs={"use_safetensors": True},
+        )
+    # 额外参数会透传给 SentenceTransformer
+    return HuggingFaceEmbedding(
+        model_name=model_name,
+        embed_batch_size=embed_batch_size,
+        device="cpu",
+        backend="onnx",
+        model_kwargs={"file_name": onnx_file_name(backend, int8_config), "provider": "CPUExecutionProvider"},
+    )
+
+
+def export(model_name: str = MODEL_NAME, int8_config: str = INT8_CONFIG):
+    """导出 onnx/model.onnx 和动态量化后的 onnx/model_qint8_<config>.onnx"""
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    # 目录下还没有 onnx 模型时, sentence-transformers 会从 PyTorch 权重导出
+    model = SentenceTransformer(model_name, backend="onnx", device="cpu")
+    model.save_pretrained(model_name)
+    print(f"✅ exported {model_name}/{onnx_file_name('onnx')}")
+
+    export_dynamic_quantized_onnx_model(model, int8_config, model_name)
+    print(f"✅ exported {model_name}/{onnx_file_name('onnx-int8', int8_config)}")
+
+
+def convert_safetensors(model_name: str = MODEL_NAME):
+    """把 pytorch_model.bin 转存为 model.safetensors, 原文件保留"""
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    model[0].auto_model.save_pretrained(model_name, safe_serialization=True)
+    print(f"✅ exported {model_name}/model.safetensors")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export ONNX / int8 / safetensors embedding models")
+    parser.add_argument("command", choices=["export", "safetensors"])
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--int8-config", default=INT8_CONFIG)
+    args = parser.parse_args()
+
+    if args.command == "safetensors":
+        convert_safetensors(args.model)
+    else:
+        export(args.model, args.int8_config)
@@ -0,0 +1,132 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    动态微批处理: 把并发到达的单条请求攒成一批, 只做一次前向计算, 再把结果分发回各自的调用方。
+    一批在凑满 max_batch_size 条或等待超过 max_wait_ms 时发出。
+    模型只在后台线程里被调用, gRPC 线程只负责排队和等待结果。
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[list[str]], list[list[float]]],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        stats_log_interval: float = 60.0,
+    ):
+        self._embed_fn = embed_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.stats_log_interval = stats_log_interval
+
+        self._queue: queue.Queue[tuple[str, Future]] = queue.Queue()
+        self._stopped = threading.Event()
+
+        # 统计信息
+        self._stats_lock = threading.Lock()
+        self._num_batches = 0
+        self._num_texts = 0
+        self._largest_batch = 0
+        self._batch_size_hist: Counter[int] = Counter()  # key: 不小于 batch 大小的最小 2 的幂
+        self._last_log = time.monotonic()
+
+        self._thread = threading.Thread(target=self._loop, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: list[str]) -> list[Future]:
+        """排队一组文本, 返回与之一一对应的 Future"""
+        if self._stopped.is_set():
+            raise RuntimeError("batcher is stopped")
+        futures = []
+        for text in texts:
+            fut = Future()
+            self._queue.put((text, fut))
+            futures.append(fut)
+        return futures
+
+    def embed(self, texts: list[str], timeout: float | None = None) -> list[list[float]]:
+        """阻塞直到所有文本嵌入完成"""
+        return [fut.result(timeout) for fut in self.submit(texts)]
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        # 让还在排队的调用方尽快失败, 而不是一直等下去
+        while True:
+            try:
+                _, fut = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if fut.set_running_or_notify_cancel():
+                fut.set_exception(RuntimeError("batcher is stopped"))
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self._num_batches,
+                "texts": self._num_texts,
+                "avg_batch_size": self._num_texts / self._num_batches if self._num_batches else 0.0,
+                "largest_batch": self._largest_batch,
+                "batch_size_histogram": dict(sorted(self._batch_size_hist.items())),
+            }
+
+    def _collect(self, first: tuple[str, Future]) -> list[tuple[str, Future]]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                self._maybe_log_stats()
+                continue
+
+            # 跳过调用方已经取消的请求
+            batch = [(t, f) for t, f in self._collect(first) if f.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            try:
+                embeddings = self._embed_fn([t for t, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+            else:
+                for (_, fut), embedding in zip(batch, embeddings):
+                    fut.set_result(embedding)
+
+            self._record(len(batch))
+            self._maybe_log_stats()
+
+    def _record(self, batch_size: int):
+        with self._stats_lock:
+            self._num_batches += 1
+            self._num_texts += batch_size
+            self._largest_batch = max(self._largest_batch, batch_size)
+            self._batch_size_hist[1 << (batch_size - 1).bit_length()] += 1
+
+    def _maybe_log_stats(self):
+        now = time.monotonic()
+        if self.stats_log_interval and now - self._last_log >= self.stats_log_interval:
+            self._last_log = now
+            logger.info("batcher stats: %s", self.stats())
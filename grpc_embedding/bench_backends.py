@@ -0,0 +1,81 @@
+"""
+对比各推理后端与 PyTorch 输出的一致性, 以及吞吐和延迟:
+    python -m grpc_embedding.bench_backends --backends torch onnx onnx-int8
+测试文本取自 grape.md 的问题标题和正文段落, 覆盖短查询和长文本两种典型长度。
+一致性以 torch 为基准, 逐条计算余弦相似度, 最小值低于 --min-cosine 视为不达标。
+"""
+import argparse
+import time
+
+import numpy as np
+
+from grpc_embedding.backends import BACKENDS, MODEL_NAME, load_embed_model
+from grpc_embedding.bench_utils import GRAPE_MD, load_paragraphs, load_questions, timed
+
+
+def load_texts(path: str = GRAPE_MD, limit: int = 256) -> tuple[list[str], list[str]]:
+    """返回 (问题标题, 正文段落)"""
+    return load_questions(path)[:limit], [p.lstrip("- ") for p in load_paragraphs(path)[:limit]]
+
+
+def bench_latency(model, texts: list[str]) -> tuple[float, float]:
+    """单条查询的 p50 / p99 延迟(毫秒)"""
+    _, p50, p99 = timed(model.get_query_embedding, texts)
+    return p50, p99
+
+
+def bench_throughput(model, texts: list[str]) -> float:
+    """批量嵌入的吞吐(条/秒)"""
+    start = time.perf_counter()
+    model.get_text_embedding_batch(texts)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding inference backends")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    questions, passages = load_texts()
+    texts = questions + passages
+    print(f"{len(questions)} questions, {len(passages)} passages")
+
+    reference = None
+    rows = []
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        start = time.perf_counter()
+        model = load_embed_model(backend, args.model, embed_batch_size=args.batch_size)
+        load_s = time.perf_counter() - start
+        model.get_text_embedding_batch(texts[: args.batch_size])  # 预热
+
+        embeddings = np.asarray(model.get_text_embedding_batch(texts), dtype=np.float32)
+        if reference is None:
+            reference = embeddings
+        sims = cosine(embeddings, reference)
+        p50, p99 = bench_latency(model, questions)
+        throughput = bench_throughput(model, passages)
+        rows.append((backend, load_s, p50, p99, throughput, float(sims.min()), float(sims.mean())))
+
+    print(
+        f"\n{'backend':<12}{'load s':>8}{'p50 ms':>9}{'p99 ms':>9}{'texts/s':>10}"
+        f"{'min cos':>10}{'mean cos':>10}  parity"
+    )
+    for backend, load_s, p50, p99, throughput, min_cos, mean_cos in rows:
+        parity = "ok" if min_cos >= args.min_cosine else "FAIL"
+        print(
+            f"{backend:<12}{load_s:>8.2f}{p50:>9.2f}{p99:>9.2f}{throughput:>10.1f}"
+            f"{min_cos:>10.5f}{mean_cos:>10.5f}  {parity}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+对比三种向量返回格式的序列化开销和传输体积, 不需要启动模型或服务端:
+    python -m grpc_embedding.bench_payload --dim 768 --batch-sizes 1 32 256
+服务端耗时: 模型输出的 list[list[float]] -> EmbeddingsResponse -> bytes
+客户端耗时: bytes -> EmbeddingsResponse -> float32 矩阵(decode_embeddings) / list[list[float]]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from grpc_embedding import get_embedding_pb2
+from grpc_embedding.codec import ENCODINGS, decode_embeddings, encode_embeddings
+
+
+def timeit(fn, repeat: int) -> float:
+    """返回单次调用的平均耗时(毫秒)"""
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench(batch_size: int, dim: int, repeat: int):
+    rng = np.random.default_rng(0)
+    # 模型输出是 python list, 和服务端实际拿到的一致
+    embeddings = rng.standard_normal((batch_size, dim), dtype=np.float32).tolist()
+
+    print(f"\nbatch_size={batch_size}, dim={dim}")
+    print(f"{'encoding':<12}{'bytes':>12}{'encode ms':>12}{'decode ms':>12}{'to list ms':>12}{'max err':>12}")
+    for name, encoding in ENCODINGS.items():
+        payload = encode_embeddings(embeddings, encoding).SerializeToString()
+        decoded = decode_embeddings(get_embedding_pb2.EmbeddingsResponse.FromString(payload))
+        max_err = float(np.max(np.abs(decoded - np.asarray(embeddings, dtype=np.float32))))
+
+        encode_ms = timeit(lambda: encode_embeddings(embeddings, encoding).SerializeToString(), repeat)
+        decode_ms = timeit(lambda: decode_embeddings(get_embedding_pb2.EmbeddingsResponse.FromString(payload)), repeat)
+        to_list_ms = timeit(
+            lambda: decode_embeddings(get_embedding_pb2.EmbeddingsResponse.FromString(payload)).tolist(), repeat
+        )
+        print(f"{name:<12}{len(payload):>12}{encode_ms:>12.3f}{decode_ms:>12.3f}{to_list_ms:>12.3f}{max_err:>12.2e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding payload encodings")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32, 256])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for batch_size in args.batch_sizes:
+        bench(batch_size, args.dim, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+各 bench 脚本共用的语料读取和计时工具。
+语料是前端打包的 grape.md: "## n. ...？" 为问题标题, 其余非空、非标题的行为正文段落。
+"""
+import re
+import statistics
+import time
+from collections.abc import Callable, Sequence
+from typing import Any
+
+GRAPE_MD = "./src/frontend/dist/grape.md"
+# grape.md 的问题标题, group(1) 为问题本身
+HEADING_RE = re.compile(r"^## \d+\.\s*(.+)$")
+
+
+def load_questions(path: str = GRAPE_MD) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return [m.group(1) for line in f if (m := HEADING_RE.match(line.strip()))]
+
+
+def load_paragraphs(path: str = GRAPE_MD) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def timed(fn: Callable[[Any], Any], items: Sequence[Any]) -> tuple[list[Any], float, float]:
+    """对每个 item 调用一次 fn, 返回 (各次结果, p50 延迟, p99 延迟), 延迟单位为毫秒"""
+    results, latencies = [], []
+    for item in items:
+        start = time.perf_counter()
+        results.append(fn(item))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, statistics.median(latencies), percentile(latencies, 99)
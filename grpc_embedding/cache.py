@@ -0,0 +1,198 @@
+import atexit
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+
+# 每条缓存除向量本身外的大致开销(key、OrderedDict 节点等)
+ENTRY_OVERHEAD = 200
+# 磁盘层上限, 超过后按写入先后删除最早的行
+DISK_MAX_BYTES = 2 * 1024 * 1024 * 1024
+# 等待写盘的条数上限, 写线程跟不上时丢弃新的写入(内存层不受影响)
+MAX_PENDING_WRITES = 10000
+
+
+class EmbeddingCache:
+    """
+    按内容寻址的向量缓存, key 为 sha256(模型名 + 文本)。
+    两级存储: 内存 LRU(按字节数淘汰) + 可选的 SQLite 磁盘层(重启后仍然有效)。
+    向量以 float32 存储。put 只更新内存层, 磁盘写入由后台线程攒批、每批一个事务完成。
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_bytes: int = 256 * 1024 * 1024,
+        db_path: str | None = None,
+        max_disk_bytes: int = DISK_MAX_BYTES,
+    ):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._lru: OrderedDict[str, array] = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_writes = 0
+        self.disk_evictions = 0
+        self.dropped_writes = 0
+
+        # 连接由读(请求线程)和写(后台线程)共用, 单独加锁, 不占内存层的锁
+        self._db_lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        # 等待写盘的向量, 同一个 key 只留最新的
+        self._pending: dict[str, bytes] = {}
+        self._pending_cond = threading.Condition()
+        self._closing = False
+        self._writer: threading.Thread | None = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embedding (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._writer = threading.Thread(target=self._write_loop, name="embedding-cache-writer", daemon=True)
+            self._writer.start()
+            # 客户端进程退出前把还没写盘的向量写完
+            atexit.register(self.close)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode()).hexdigest()
+
+    def get(self, key: str) -> array | None:
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return vector
+
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            vector = array("f")
+            vector.frombytes(data)
+            self._put_memory(key, vector)
+            self.disk_hits += 1
+            return vector
+
+    def _read_disk(self, key: str) -> bytes | None:
+        with self._pending_cond:
+            data = self._pending.get(key)
+        if data is not None:
+            return data
+        with self._db_lock:
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute("SELECT vector FROM embedding WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                print(f"⚠️ embedding cache read failed: {e}")
+                return None
+        return row[0] if row is not None else None
+
+    def put(self, key: str, embedding: Sequence[float]):
+        vector = array("f", embedding)
+        with self._lock:
+            self._put_memory(key, vector)
+        if self._writer is None:
+            return
+        with self._pending_cond:
+            dropped = self._closing or (key not in self._pending and len(self._pending) >= MAX_PENDING_WRITES)
+            if not dropped:
+                self._pending[key] = vector.tobytes()
+                self._pending_cond.notify()
+        if dropped:
+            with self._lock:
+                self.dropped_writes += 1
+
+    def _write_loop(self):
+        while True:
+            with self._pending_cond:
+                while not self._pending and not self._closing:
+                    self._pending_cond.wait()
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, {}
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: dict[str, bytes]):
+        row_bytes = len(next(iter(batch.values()))) + ENTRY_OVERHEAD
+        max_rows = max(self.max_disk_bytes // row_bytes, 1)
+        with self._db_lock:
+            try:
+                # 一批一个事务; INSERT OR REPLACE 会分配新的 rowid, rowid 越小写入越早
+                with self._db:
+                    self._db.execute("BEGIN")
+                    self._db.executemany("INSERT OR REPLACE INTO embedding (key, vector) VALUES (?, ?)", batch.items())
+                    excess = self._db.execute("SELECT COUNT(*) FROM embedding").fetchone()[0] - max_rows
+                    if excess > 0:
+                        self._db.execute(
+                            "DELETE FROM embedding WHERE rowid IN (SELECT rowid FROM embedding ORDER BY rowid LIMIT ?)",
+                            (excess,),
+                        )
+            except sqlite3.Error as e:
+                # 磁盘层只是加速, 写失败时丢掉这一批, 内存层照常可用
+                print(f"⚠️ embedding cache write failed, dropped {len(batch)} entries: {e}")
+                excess = 0
+                written = 0
+            else:
+                written = len(batch)
+        with self._lock:
+            self.disk_writes += written
+            self.disk_evictions += max(excess, 0)
+            self.dropped_writes += len(batch) - written
+
+    def _put_memory(self, key: str, vector: array):
+        old = self._lru.pop(key, None)
+        if old is not None:
+            self._bytes -= self._size(old)
+        self._lru[key] = vector
+        self._bytes += self._size(vector)
+        while self._bytes > self.max_bytes and len(self._lru) > 1:
+            _, evicted = self._lru.popitem(last=False)
+            self._bytes -= self._size(evicted)
+            self.evictions += 1
+
+    @staticmethod
+    def _size(vector: array) -> int:
+        return vector.itemsize * len(vector) + ENTRY_OVERHEAD
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._lru),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_writes": self.disk_writes,
+                "disk_evictions": self.disk_evictions,
+                "dropped_writes": self.dropped_writes,
+                "pending_writes": len(self._pending),
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        """写完剩下的向量后关闭数据库, 可以重复调用"""
+        if self._writer is not None:
+            with self._pending_cond:
+                self._closing = True
+                self._pending_cond.notify()
+            self._writer.join()
+            self._writer = None
+            atexit.unregister(self.close)
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -20,6 +20,11 @@ def run():
         print(f"Embedding (length {len(response.embedding)}):")
         print(response.embedding)
 
+        # 批量请求
+        texts = ["葡萄白粉病怎么防治？", "什么时候浇水？"]
+        response = stub.GetTextEmbeddings(get_embedding_pb2.TextsRequest(texts=texts))
+        print(f"Batch embeddings: {[len(e.embedding) for e in response.embeddings]}")
+
     except grpc.RpcError as e:
         print(f"RPC failed: {e.code()} - {e.details()}")
 
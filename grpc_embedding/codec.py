@@ -0,0 +1,58 @@
+"""
+向量在 EmbeddingResponse / EmbeddingsResponse 中的编码与解码。
+FLOAT_LIST 走 repeated float 字段(兼容旧客户端), PACKED_* 把向量以小端二进制放进 packed 字段,
+解码时用 np.frombuffer 直接在收到的 bytes 上建视图, 不做逐元素转换。
+"""
+from collections.abc import Sequence
+
+import numpy as np
+
+from grpc_embedding import get_embedding_pb2
+
+# 配置和命令行里使用的名字 -> Encoding
+ENCODINGS = {
+    "float_list": get_embedding_pb2.FLOAT_LIST,
+    "float32": get_embedding_pb2.PACKED_FLOAT32,
+    "float16": get_embedding_pb2.PACKED_FLOAT16,
+}
+DTYPES = {
+    get_embedding_pb2.PACKED_FLOAT32: np.dtype("<f4"),
+    get_embedding_pb2.PACKED_FLOAT16: np.dtype("<f2"),
+}
+
+
+def encode_embedding(embedding: Sequence[float], encoding: int) -> get_embedding_pb2.EmbeddingResponse:
+    if encoding not in DTYPES:
+        return get_embedding_pb2.EmbeddingResponse(embedding=embedding)
+    vector = np.asarray(embedding, dtype=DTYPES[encoding])
+    return get_embedding_pb2.EmbeddingResponse(packed=vector.tobytes(), encoding=encoding, dim=len(vector))
+
+
+def encode_embeddings(embeddings: Sequence[Sequence[float]], encoding: int) -> get_embedding_pb2.EmbeddingsResponse:
+    if encoding not in DTYPES:
+        return get_embedding_pb2.EmbeddingsResponse(
+            embeddings=[get_embedding_pb2.EmbeddingResponse(embedding=e) for e in embeddings]
+        )
+    matrix = np.asarray(embeddings, dtype=DTYPES[encoding])
+    dim = matrix.shape[1] if matrix.ndim == 2 else 0
+    return get_embedding_pb2.EmbeddingsResponse(packed=matrix.tobytes(), encoding=encoding, dim=dim)
+
+
+def decode_embedding(response: get_embedding_pb2.EmbeddingResponse) -> np.ndarray:
+    """返回 float32 向量; PACKED_FLOAT32 时是 response.packed 上的只读视图"""
+    if response.encoding not in DTYPES:
+        # 旧服务端不认识 encoding, 仍然返回 repeated float
+        return np.asarray(response.embedding, dtype=np.float32)
+    return np.frombuffer(response.packed, dtype=DTYPES[response.encoding]).astype(np.float32, copy=False)
+
+
+def decode_embeddings(response: get_embedding_pb2.EmbeddingsResponse) -> np.ndarray:
+    """返回 len(texts) x dim 的 float32 矩阵; PACKED_FLOAT32 时是 response.packed 上的只读视图"""
+    if response.encoding not in DTYPES:
+        if not response.embeddings:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.asarray([e.embedding for e in response.embeddings], dtype=np.float32)
+    if not response.packed:
+        return np.empty((0, response.dim), dtype=np.float32)
+    matrix = np.frombuffer(response.packed, dtype=DTYPES[response.encoding])
+    return matrix.reshape(-1, response.dim).astype(np.float32, copy=False)
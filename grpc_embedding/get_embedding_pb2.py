@@ -24,17 +24,31 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x13get_embedding.proto\x12\tembedding\"\x1b\n\x0bTextRequest\x12\x0c\n\x04text\x18\x01 \x01(\t\"&\n\x11\x45mbeddingResponse\x12\x11\n\tembedding\x18\x01 \x03(\x02\x32\\\n\x10\x45mbeddingService\x12H\n\x10GetTextEmbedding\x12\x16.embedding.TextRequest\x1a\x1c.embedding.EmbeddingResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x13get_embedding.proto\x12\tembedding\"B\n\x0bTextRequest\x12\x0c\n\x04text\x18\x01 \x01(\t\x12%\n\x08\x65ncoding\x18\x02 \x01(\x0e\x32\x13.embedding.Encoding\"j\n\x11\x45mbeddingResponse\x12\x11\n\tembedding\x18\x01 \x03(\x02\x12\x0e\n\x06packed\x18\x02 \x01(\x0c\x12%\n\x08\x65ncoding\x18\x03 \x01(\x0e\x32\x13.embedding.Encoding\x12\x0b\n\x03\x64im\x18\x04 \x01(\r\"D\n\x0cTextsRequest\x12\r\n\x05texts\x18\x01 \x03(\t\x12%\n\x08\x65ncoding\x18\x02 \x01(\x0e\x32\x13.embedding.Encoding\"\x8a\x01\n\x12\x45mbeddingsResponse\x12\x30\n\nembeddings\x18\x01 \x03(\x0b\x32\x1c.embedding.EmbeddingResponse\x12\x0e\n\x06packed\x18\x02 \x01(\x0c\x12%\n\x08\x65ncoding\x18\x03 \x01(\x0e\x32\x13.embedding.Encoding\x12\x0b\n\x03\x64im\x18\x04 \x01(\r\"U\n\x0eSeqTextRequest\x12\x0e\n\x06seq_id\x18\x01 \x01(\x04\x12\x0c\n\x04text\x18\x02 \x01(\t\x12%\n\x08\x65ncoding\x18\x03 \x01(\x0e\x32\x13.embedding.Encoding\"W\n\x14SeqEmbeddingResponse\x12\x0e\n\x06seq_id\x18\x01 \x01(\x04\x12/\n\tembedding\x18\x02 \x01(\x0b\x32\x1c.embedding.EmbeddingResponse\"\x0e\n\x0cStatsRequest\"H\n\rStatsResponse\x12\x17\n\x0fprometheus_text\x18\x01 \x01(\t\x12\r\n\x05model\x18\x02 \x01(\t\x12\x0f\n\x07\x62\x61\x63kend\x18\x03 \x01(\t*B\n\x08\x45ncoding\x12\x0e\n\nFLOAT_LIST\x10\x00\x12\x12\n\x0ePACKED_FLOAT32\x10\x01\x12\x12\n\x0ePACKED_FLOAT16\x10\x02\x32\xc0\x02\n\x10\x45mbeddingService\x12H\n\x10GetTextEmbedding\x12\x16.embedding.TextRequest\x1a\x1c.embedding.EmbeddingResponse\x12K\n\x11GetTextEmbeddings\x12\x17.embedding.TextsRequest\x1a\x1d.embedding.EmbeddingsResponse\x12V\n\x14StreamTextEmbeddings\x12\x19.embedding.SeqTextRequest\x1a\x1f.embedding.SeqEmbeddingResponse(\x01\x30\x01\x12=\n\x08GetStats\x12\x17.embedding.StatsRequest\x1a\x18.embedding.StatsResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'get_embedding_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
+  _globals['_ENCODING']._serialized_start=687
+  _globals['_ENCODING']._serialized_end=753
   _globals['_TEXTREQUEST']._serialized_start=34
-  _globals['_TEXTREQUEST']._serialized_end=61
-  _globals['_EMBEDDINGRESPONSE']._serialized_start=63
-  _globals['_EMBEDDINGRESPONSE']._serialized_end=101
-  _globals['_EMBEDDINGSERVICE']._serialized_start=103
-  _globals['_EMBEDDINGSERVICE']._serialized_end=195
+  _globals['_TEXTREQUEST']._serialized_end=100
+  _globals['_EMBEDDINGRESPONSE']._serialized_start=102
+  _globals['_EMBEDDINGRESPONSE']._serialized_end=208
+  _globals['_TEXTSREQUEST']._serialized_start=210
+  _globals['_TEXTSREQUEST']._serialized_end=278
+  _globals['_EMBEDDINGSRESPONSE']._serialized_start=281
+  _globals['_EMBEDDINGSRESPONSE']._serialized_end=419
+  _globals['_SEQTEXTREQUEST']._serialized_start=421
+  _globals['_SEQTEXTREQUEST']._serialized_end=506
+  _globals['_SEQEMBEDDINGRESPONSE']._serialized_start=508
+  _globals['_SEQEMBEDDINGRESPONSE']._serialized_end=595
+  _globals['_STATSREQUEST']._serialized_start=597
+  _globals['_STATSREQUEST']._serialized_end=611
+  _globals['_STATSRESPONSE']._serialized_start=613
+  _globals['_STATSRESPONSE']._serialized_end=685
+  _globals['_EMBEDDINGSERVICE']._serialized_start=756
+  _globals['_EMBEDDINGSERVICE']._serialized_end=1076
 # @@protoc_insertion_point(module_scope)
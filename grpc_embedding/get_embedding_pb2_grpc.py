@@ -40,6 +40,21 @@ class EmbeddingServiceStub(object):
                 request_serializer=get__embedding__pb2.TextRequest.SerializeToString,
                 response_deserializer=get__embedding__pb2.EmbeddingResponse.FromString,
                 _registered_method=True)
+        self.GetTextEmbeddings = channel.unary_unary(
+                '/embedding.EmbeddingService/GetTextEmbeddings',
+                request_serializer=get__embedding__pb2.TextsRequest.SerializeToString,
+                response_deserializer=get__embedding__pb2.EmbeddingsResponse.FromString,
+                _registered_method=True)
+        self.StreamTextEmbeddings = channel.stream_stream(
+                '/embedding.EmbeddingService/StreamTextEmbeddings',
+                request_serializer=get__embedding__pb2.SeqTextRequest.SerializeToString,
+                response_deserializer=get__embedding__pb2.SeqEmbeddingResponse.FromString,
+                _registered_method=True)
+        self.GetStats = channel.unary_unary(
+                '/embedding.EmbeddingService/GetStats',
+                request_serializer=get__embedding__pb2.StatsRequest.SerializeToString,
+                response_deserializer=get__embedding__pb2.StatsResponse.FromString,
+                _registered_method=True)
 
 
 class EmbeddingServiceServicer(object):
@@ -52,6 +67,27 @@ class EmbeddingServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetTextEmbeddings(self, request, context):
+        """一次请求嵌入多条文本, 服务端只做一次批量前向计算
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def StreamTextEmbeddings(self, request_iterator, context):
+        """双向流, 用于大批量导入: 客户端持续推送文本, 服务端攒批计算后持续推回结果
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetStats(self, request, context):
+        """请求数、延迟、batch 大小、缓存命中率、在途请求数等指标
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_EmbeddingServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -60,6 +96,21 @@ def add_EmbeddingServiceServicer_to_server(servicer, server):
                     request_deserializer=get__embedding__pb2.TextRequest.FromString,
                     response_serializer=get__embedding__pb2.EmbeddingResponse.SerializeToString,
             ),
+            'GetTextEmbeddings': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetTextEmbeddings,
+                    request_deserializer=get__embedding__pb2.TextsRequest.FromString,
+                    response_serializer=get__embedding__pb2.EmbeddingsResponse.SerializeToString,
+            ),
+            'StreamTextEmbeddings': grpc.stream_stream_rpc_method_handler(
+                    servicer.StreamTextEmbeddings,
+                    request_deserializer=get__embedding__pb2.SeqTextRequest.FromString,
+                    response_serializer=get__embedding__pb2.SeqEmbeddingResponse.SerializeToString,
+            ),
+            'GetStats': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetStats,
+                    request_deserializer=get__embedding__pb2.StatsRequest.FromString,
+                    response_serializer=get__embedding__pb2.StatsResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'embedding.EmbeddingService', rpc_method_handlers)
@@ -98,3 +149,84 @@ class EmbeddingService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def GetTextEmbeddings(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/embedding.EmbeddingService/GetTextEmbeddings',
+            get__embedding__pb2.TextsRequest.SerializeToString,
+            get__embedding__pb2.EmbeddingsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def StreamTextEmbeddings(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/embedding.EmbeddingService/StreamTextEmbeddings',
+            get__embedding__pb2.SeqTextRequest.SerializeToString,
+            get__embedding__pb2.SeqEmbeddingResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GetStats(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/embedding.EmbeddingService/GetStats',
+            get__embedding__pb2.StatsRequest.SerializeToString,
+            get__embedding__pb2.StatsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,171 @@
+"""
+服务端指标: 按方法统计请求数、状态码、延迟直方图和在途请求数, 并与 batcher / cache 的统计一起
+输出为 Prometheus 文本格式(另附启动各阶段耗时), 可以通过 GetStats RPC 或 --metrics-port 的 HTTP /metrics 获取。
+"""
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import grpc
+
+# 延迟直方图的桶边界(秒)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.requests: Counter[tuple[str, str]] = Counter()  # (method, status code)
+        self.latency_buckets: dict[str, list[int]] = {}
+        self.latency_sum: Counter[str] = Counter()
+        self.latency_count: Counter[str] = Counter()
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, method: str, code: str, seconds: float):
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[(method, code)] += 1
+            buckets = self.latency_buckets.setdefault(method, [0] * len(LATENCY_BUCKETS))
+            for i, le in enumerate(LATENCY_BUCKETS):
+                if seconds <= le:
+                    buckets[i] += 1
+            self.latency_sum[method] += seconds
+            self.latency_count[method] += 1
+
+    def render(self, stats: dict, labels: dict[str, str] | None = None) -> str:
+        """stats 为 EmbeddingServiceServicer.stats() 的返回值"""
+        base = ",".join(f'{k}="{v}"' for k, v in (labels or {}).items())
+
+        def fmt(name: str, value: float, **extra) -> str:
+            label_str = ",".join(filter(None, [base, *(f'{k}="{v}"' for k, v in extra.items())]))
+            return f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}"
+
+        lines = []
+        with self._lock:
+            lines += ["# TYPE embedding_in_flight_requests gauge", fmt("embedding_in_flight_requests", self.in_flight)]
+
+            lines.append("# TYPE embedding_requests_total counter")
+            for (method, code), n in sorted(self.requests.items()):
+                lines.append(fmt("embedding_requests_total", n, method=method, code=code))
+
+            lines.append("# TYPE embedding_request_latency_seconds histogram")
+            for method, buckets in sorted(self.latency_buckets.items()):
+                for le, n in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(fmt("embedding_request_latency_seconds_bucket", n, method=method, le=le))
+                count = self.latency_count[method]
+                lines.append(fmt("embedding_request_latency_seconds_bucket", count, method=method, le="+Inf"))
+                lines.append(fmt("embedding_request_latency_seconds_sum", self.latency_sum[method], method=method))
+                lines.append(fmt("embedding_request_latency_seconds_count", count, method=method))
+
+        batcher = stats["batcher"]
+        lines += ["# TYPE embedding_batch_queue_depth gauge", fmt("embedding_batch_queue_depth", batcher["queue_depth"])]
+        lines.append("# TYPE embedding_batch_size histogram")
+        cumulative = 0
+        for le, n in batcher["batch_size_histogram"].items():
+            cumulative += n
+            lines.append(fmt("embedding_batch_size_bucket", cumulative, le=le))
+        lines.append(fmt("embedding_batch_size_bucket", batcher["batches"], le="+Inf"))
+        lines.append(fmt("embedding_batch_size_sum", batcher["texts"]))
+        lines.append(fmt("embedding_batch_size_count", batcher["batches"]))
+
+        cache = stats["cache"]
+        lines.append("# TYPE embedding_cache_lookups_total counter")
+        for result in ("hits", "disk_hits", "misses"):
+            lines.append(fmt("embedding_cache_lookups_total", cache[result], result=result))
+        lines += [
+            "# TYPE embedding_cache_hit_ratio gauge",
+            fmt("embedding_cache_hit_ratio", cache["hit_rate"]),
+            "# TYPE embedding_cache_entries gauge",
+            fmt("embedding_cache_entries", cache["entries"]),
+            "# TYPE embedding_cache_bytes gauge",
+            fmt("embedding_cache_bytes", cache["bytes"]),
+        ]
+
+        # 启动各阶段耗时: bind / load / warmup / total
+        lines.append("# TYPE embedding_startup_seconds gauge")
+        for phase, seconds in stats.get("startup", {}).items():
+            lines.append(fmt("embedding_startup_seconds", seconds, phase=phase))
+        return "\n".join(lines) + "\n"
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """给所有 unary-unary 和 stream-stream 方法计时, 记录状态码和在途数"""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = handler_call_details.method.rsplit("/", 1)[-1]
+        metrics = self.metrics
+
+        def status(context, error: Exception | None) -> str:
+            code = context.code()
+            if code is None:
+                code = grpc.StatusCode.UNKNOWN if error else grpc.StatusCode.OK
+            return code.name
+
+        if handler.unary_unary:
+            behavior = handler.unary_unary
+
+            def unary_unary(request, context):
+                metrics.start()
+                start, error = time.perf_counter(), None
+                try:
+                    return behavior(request, context)
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    metrics.finish(method, status(context, error), time.perf_counter() - start)
+
+            return handler._replace(unary_unary=unary_unary)
+
+        if handler.stream_stream:
+            behavior = handler.stream_stream
+
+            def stream_stream(request_iterator, context):
+                metrics.start()
+                start, error = time.perf_counter(), None
+                try:
+                    yield from behavior(request_iterator, context)
+                except Exception as e:
+                    error = e
+                    raise
+                finally:
+                    metrics.finish(method, status(context, error), time.perf_counter() - start)
+
+            return handler._replace(stream_stream=stream_stream)
+
+        return handler
+
+
+def serve_http(render: Callable[[], str], port: int) -> ThreadingHTTPServer:
+    """在后台线程里提供 GET /metrics"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("", port), Handler)
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+    return httpd
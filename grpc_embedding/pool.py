@@ -0,0 +1,205 @@
+"""
+客户端连接池: 每个服务端副本一条 channel(同步和 grpc.aio 各一条), 请求按最少在途数或轮询分配。
+可重试的错误会带退避换一个副本重试, 出错的副本在 eject_seconds 内不再优先选择;
+重试用尽或遇到不可重试的错误时抛出 EmbeddingServiceError, 不再返回空向量。
+"""
+import asyncio
+import itertools
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from typing import Literal, TypeVar
+
+import grpc
+
+from grpc_embedding import get_embedding_pb2_grpc
+
+T = TypeVar("T")
+
+KEEPALIVE_OPTIONS = [
+    ("grpc.keepalive_time_ms", 30_000),
+    ("grpc.keepalive_timeout_ms", 10_000),
+    ("grpc.keepalive_permit_without_calls", 1),
+    ("grpc.http2.max_pings_without_data", 0),
+]
+
+# 换一个副本有可能成功的错误
+RETRYABLE_CODES = {
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.ABORTED,
+}
+
+
+class EmbeddingServiceError(RuntimeError):
+    def __init__(self, message: str, code: grpc.StatusCode | None = None):
+        super().__init__(message)
+        self.code = code
+
+
+class Endpoint:
+    def __init__(self, address: str):
+        self.address = address
+        self.channel = grpc.insecure_channel(address, options=KEEPALIVE_OPTIONS)
+        self.stub = get_embedding_pb2_grpc.EmbeddingServiceStub(self.channel)
+        # grpc.aio 的 channel 绑定在创建它的事件循环上, 每个循环第一次异步调用时创建一条;
+        # 循环结束(每次 asyncio.run 都会新建一个循环)后, 它的 channel 在下一次异步调用时关闭
+        self.achannels: dict[
+            asyncio.AbstractEventLoop, tuple[grpc.aio.Channel, get_embedding_pb2_grpc.EmbeddingServiceStub]
+        ] = {}
+        self._closing: set[asyncio.Task] = set()
+        self.outstanding = 0
+        self.ejected_until = 0.0
+
+    def get_astub(self) -> get_embedding_pb2_grpc.EmbeddingServiceStub:
+        loop = asyncio.get_running_loop()
+        entry = self.achannels.get(loop)
+        if entry is None:
+            # 旧循环上已经没有在途调用, 在当前循环上关闭它的 channel
+            stale = [self.achannels.pop(old, None) for old in [old for old in self.achannels if old.is_closed()]]
+            self._close_later(loop, [entry[0] for entry in stale if entry is not None])
+            channel = grpc.aio.insecure_channel(self.address, options=KEEPALIVE_OPTIONS)
+            entry = self.achannels[loop] = (channel, get_embedding_pb2_grpc.EmbeddingServiceStub(channel))
+        return entry[1]
+
+    def _close_later(self, loop: asyncio.AbstractEventLoop, channels: list[grpc.aio.Channel]):
+        for channel in channels:
+            task = loop.create_task(channel.close())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    def close(self):
+        self.channel.close()
+        channels = [channel for channel, _ in self.achannels.values()]
+        self.achannels.clear()
+        if not channels:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(_close_all(channels))
+        else:
+            self._close_later(loop, channels)
+
+
+async def _close_all(channels: list[grpc.aio.Channel]):
+    await asyncio.gather(*(channel.close() for channel in channels))
+
+
+class ChannelPool:
+    def __init__(
+        self,
+        addresses: list[str],
+        policy: Literal["least_outstanding", "round_robin"] = "least_outstanding",
+        max_attempts: int = 3,
+        backoff_base: float = 0.1,
+        backoff_max: float = 2.0,
+        eject_seconds: float = 5.0,
+    ):
+        if not addresses:
+            raise ValueError("at least one embedding server address is required")
+        self.endpoints = [Endpoint(address) for address in addresses]
+        self.policy = policy
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.eject_seconds = eject_seconds
+        self._lock = threading.Lock()
+        self._rr = itertools.count()
+
+    def _acquire(self, tried: set[Endpoint]) -> Endpoint:
+        with self._lock:
+            now = time.monotonic()
+            candidates = [ep for ep in self.endpoints if ep not in tried and ep.ejected_until <= now]
+            # 所有副本都试过或都被摘除时, 退而求其次
+            candidates = candidates or [ep for ep in self.endpoints if ep not in tried] or self.endpoints
+            start = next(self._rr) % len(candidates)
+            candidates = candidates[start:] + candidates[:start]
+            ep = candidates[0] if self.policy == "round_robin" else min(candidates, key=lambda e: e.outstanding)
+            ep.outstanding += 1
+            return ep
+
+    def _release(self, ep: Endpoint, error: grpc.RpcError | None = None):
+        with self._lock:
+            ep.outstanding -= 1
+            # 只摘除可能是副本本身出问题的情况, 参数错误之类不影响其他请求
+            if error is not None and error.code() in RETRYABLE_CODES:
+                ep.ejected_until = time.monotonic() + self.eject_seconds
+
+    def _backoff(self, attempt: int) -> float:
+        return min(self.backoff_max, self.backoff_base * 2**attempt) * random.uniform(0.5, 1.0)
+
+    def _error(self, e: grpc.RpcError, ep: Endpoint, attempts: int) -> EmbeddingServiceError:
+        return EmbeddingServiceError(
+            f"embedding RPC to {ep.address} failed after {attempts} attempt(s): {e.code()} - {e.details()}",
+            e.code(),
+        )
+
+    def call(self, fn: Callable[[get_embedding_pb2_grpc.EmbeddingServiceStub], T]) -> T:
+        """fn 用给定的 stub 发起一次完整调用; 失败时按策略换副本重试"""
+        tried: set[Endpoint] = set()
+        for attempt in range(self.max_attempts):
+            ep = self._acquire(tried)
+            try:
+                res = fn(ep.stub)
+            except grpc.RpcError as e:
+                self._release(ep, e)
+                if e.code() not in RETRYABLE_CODES or attempt == self.max_attempts - 1:
+                    raise self._error(e, ep, attempt + 1) from e
+                tried.add(ep)
+                time.sleep(self._backoff(attempt))
+            except BaseException:
+                self._release(ep)
+                raise
+            else:
+                self._release(ep)
+                return res
+
+    def close(self):
+        """关闭所有副本的 channel, 之后不能再使用"""
+        for ep in self.endpoints:
+            ep.close()
+
+    def call_each(self, fn: Callable[[get_embedding_pb2_grpc.EmbeddingServiceStub], T]) -> dict[str, T]:
+        """对每个副本各调用一次(不重试), 返回 地址 -> 结果; 调用失败的副本不在结果里"""
+        res = {}
+        for ep in self.endpoints:
+            try:
+                res[ep.address] = fn(ep.stub)
+            except grpc.RpcError:
+                continue
+        return res
+
+    async def acall_each(
+        self, fn: Callable[[get_embedding_pb2_grpc.EmbeddingServiceStub], Awaitable[T]]
+    ) -> dict[str, T]:
+        results = await asyncio.gather(*(fn(ep.get_astub()) for ep in self.endpoints), return_exceptions=True)
+        res = {}
+        for ep, r in zip(self.endpoints, results):
+            if isinstance(r, grpc.RpcError):
+                continue
+            if isinstance(r, BaseException):
+                raise r
+            res[ep.address] = r
+        return res
+
+    async def acall(self, fn: Callable[[get_embedding_pb2_grpc.EmbeddingServiceStub], Awaitable[T]]) -> T:
+        tried: set[Endpoint] = set()
+        for attempt in range(self.max_attempts):
+            ep = self._acquire(tried)
+            try:
+                res = await fn(ep.get_astub())
+            except grpc.RpcError as e:
+                self._release(ep, e)
+                if e.code() not in RETRYABLE_CODES or attempt == self.max_attempts - 1:
+                    raise self._error(e, ep, attempt + 1) from e
+                tried.add(ep)
+                await asyncio.sleep(self._backoff(attempt))
+            except BaseException:
+                self._release(ep)
+                raise
+            else:
+                self._release(ep)
+                return res
@@ -1,45 +1,340 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import threading
 import time
+from collections import deque
 from concurrent import futures
 
 import grpc
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+from grpc_health.v1 import health, health_pb2, health_pb2_grpc
 
 from grpc_embedding import get_embedding_pb2, get_embedding_pb2_grpc
+from grpc_embedding.backends import BACKENDS, MODEL_NAME, load_embed_model
+from grpc_embedding.batcher import MicroBatcher
+from grpc_embedding.cache import EmbeddingCache
+from grpc_embedding.codec import encode_embedding, encode_embeddings
+from grpc_embedding.metrics import Metrics, MetricsInterceptor, serve_http
+
+# 单次前向计算的最大文本数, 批量请求会按此大小切分
+EMBED_BATCH_SIZE = 64
+# 攒批最多等待的时间, 越大 batch 越满, 单条请求延迟也越高
+MAX_WAIT_MS = 5.0
+# gRPC 线程只排队等结果, 可以比 CPU 核数多
+MAX_WORKERS = 32
+# 单条流上最多在途(已读取但未返回)的文本数, 超过后暂停读取请求, 由 HTTP/2 流控反压到客户端
+STREAM_MAX_INFLIGHT = 256
+# 向量缓存: 内存 LRU 上限, 以及磁盘层的位置(None 表示只用内存)
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+CACHE_MAX_DISK_BYTES = 2 * 1024 * 1024 * 1024
+CACHE_DB_PATH = "./cache/embedding_cache.sqlite"
+PORT = 50051
+# 收到退出信号后, 给在途请求留的时间(秒)
+SHUTDOWN_GRACE = 5.0
+SERVICE_NAME = get_embedding_pb2.DESCRIPTOR.services_by_name["EmbeddingService"].full_name
+# 模型加载后按典型的长度和 batch 大小各跑一次, 之后才对外报告 SERVING
+WARMUP_QUERY = "葡萄白粉病怎么防治？"
+WARMUP_PASSAGE = (
+    "葡萄白粉病主要危害叶片、新梢和果实, 发病初期叶面出现灰白色霉斑, 后期霉层变为灰褐色, 果实受害后停止生长、"
+    "容易开裂。防治上应在冬季清园, 剪除病枝病叶并集中烧毁; 生长季注意通风透光, 控制氮肥用量; "
+    "发病前喷施石硫合剂或硫悬浮剂保护, 发病初期可选用三唑酮、戊唑醇等药剂, 间隔七到十天喷一次, 连喷两到三次。"
+)
+# (batch 大小, 文本): 单条查询、攒满的一批查询、导入时的段落
+WARMUP_BATCHES = [(1, WARMUP_QUERY), (EMBED_BATCH_SIZE, WARMUP_QUERY), (1, WARMUP_PASSAGE), (8, WARMUP_PASSAGE)]
+
+
+def time_remaining(context) -> float | None:
+    # 客户端没有设置 deadline 时 time_remaining() 返回一个极大的值, 不能直接当作 timeout
+    remaining = context.time_remaining()
+    return remaining if remaining is not None and remaining < 86400 else None
 
 
 class EmbeddingServiceServicer(get_embedding_pb2_grpc.EmbeddingServiceServicer):
-    def __init__(self):
-        self.embed_model = HuggingFaceEmbedding(
-            model_name="./embedding_models/text2vec-base-chinese"
+    def __init__(
+        self,
+        max_batch_size: int = EMBED_BATCH_SIZE,
+        max_wait_ms: float = MAX_WAIT_MS,
+        cache_max_bytes: int = CACHE_MAX_BYTES,
+        cache_db_path: str | None = CACHE_DB_PATH,
+        cache_max_disk_bytes: int = CACHE_MAX_DISK_BYTES,
+        backend: str = "torch",
+    ):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        # 模型由 load() 加载, 这样可以先绑定端口, 加载和预热期间对请求返回 UNAVAILABLE
+        self.embed_model = None
+        self.ready = threading.Event()
+        # 启动各阶段耗时(秒)
+        self.startup: dict[str, float] = {}
+        # 所有未命中缓存的请求都经过 batcher, 由它统一调用模型
+        self.batcher = MicroBatcher(
+            self._embed_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+        )
+        # 不同后端(尤其是 int8)的输出有细微差别, 缓存按后端区分
+        self.cache = EmbeddingCache(
+            f"{MODEL_NAME}:{backend}",
+            max_bytes=cache_max_bytes,
+            db_path=cache_db_path,
+            max_disk_bytes=cache_max_disk_bytes,
+        )
+        # 正在计算中的文本, 相同文本的并发请求共用一个 Future
+        self._inflight: dict[str, futures.Future] = {}
+        # 回调可能在 add_done_callback 里同步执行, 所以用可重入锁
+        self._inflight_lock = threading.RLock()
+        self.metrics = Metrics()
+
+    def load(self, num_threads: int | None = None):
+        start = time.perf_counter()
+        if num_threads:
+            import torch
+
+            # 限制 torch 算子内线程数, 避免多个 worker 抢同一批核
+            torch.set_num_threads(num_threads)
+        self.embed_model = load_embed_model(self.backend, MODEL_NAME, embed_batch_size=self.max_batch_size)
+        self.startup["load"] = time.perf_counter() - start
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_model.get_text_embedding_batch(texts)
+
+    def _check_ready(self, context):
+        # 客户端连接池会把 UNAVAILABLE 当作可重试, 换一个已就绪的副本
+        if not self.ready.is_set():
+            context.abort(grpc.StatusCode.UNAVAILABLE, "embedding model is still loading")
+
+    def submit(self, texts: list[str]) -> list[futures.Future]:
+        """先查缓存, 只把未命中的文本交给 batcher"""
+        res = []
+        for text in texts:
+            key = self.cache.key(text)
+            embedding = self.cache.get(key)
+            if embedding is not None:
+                fut = futures.Future()
+                fut.set_result(embedding)
+            else:
+                with self._inflight_lock:
+                    fut = self._inflight.get(key)
+                    if fut is None:
+                        fut = self.batcher.submit([text])[0]
+                        self._inflight[key] = fut
+                        fut.add_done_callback(lambda f, key=key: self._on_done(key, f))
+            res.append(fut)
+        return res
+
+    def _on_done(self, key: str, fut: futures.Future):
+        # 在 batcher 线程上执行: put 只更新内存层, 写盘交给缓存的后台线程
+        try:
+            if not fut.cancelled() and fut.exception() is None:
+                self.cache.put(key, fut.result())
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def embed(self, texts: list[str], timeout: float | None = None) -> list:
+        return [fut.result(timeout) for fut in self.submit(texts)]
+
+    def stats(self) -> dict:
+        return {"batcher": self.batcher.stats(), "cache": self.cache.stats(), "startup": dict(self.startup)}
+
+    def warmup(self):
+        # 直接调用模型, 不经过缓存和 batcher, 保证每种形状都真正跑一次前向计算
+        start = time.perf_counter()
+        for batch_size, text in WARMUP_BATCHES:
+            self.embed_model.get_text_embedding_batch([text] * min(batch_size, self.max_batch_size))
+        self.startup["warmup"] = time.perf_counter() - start
+        self.ready.set()
+
+    def GetStats(self, request, context):
+        return get_embedding_pb2.StatsResponse(
+            prometheus_text=self.metrics.render(self.stats(), {"pid": os.getpid(), "backend": self.backend}),
+            model=MODEL_NAME,
+            backend=self.backend,
         )
 
     def GetTextEmbedding(self, request, context):
+        self._check_ready(context)
         try:
             # 调用嵌入模型获取向量
-            embedding = self.embed_model.get_text_embedding(request.text)
-            return get_embedding_pb2.EmbeddingResponse(embedding=embedding)
+            embedding, = self.embed([request.text], timeout=time_remaining(context))
+            return encode_embedding(embedding, request.encoding)
+        except futures.TimeoutError:
+            context.set_details("embedding timed out in batch queue")
+            context.set_code(grpc.StatusCode.DEADLINE_EXCEEDED)
+            return get_embedding_pb2.EmbeddingResponse()
         except Exception as e:
             context.set_details(str(e))
             context.set_code(grpc.StatusCode.INTERNAL)
             return get_embedding_pb2.EmbeddingResponse()
 
+    def GetTextEmbeddings(self, request, context):
+        self._check_ready(context)
+        try:
+            # 与其他并发请求一起攒批, 按 EMBED_BATCH_SIZE 做批量前向计算
+            embeddings = self.embed(list(request.texts), timeout=time_remaining(context))
+            return encode_embeddings(embeddings, request.encoding)
+        except futures.TimeoutError:
+            context.set_details("embedding timed out in batch queue")
+            context.set_code(grpc.StatusCode.DEADLINE_EXCEEDED)
+            return get_embedding_pb2.EmbeddingsResponse()
+        except Exception as e:
+            context.set_details(str(e))
+            context.set_code(grpc.StatusCode.INTERNAL)
+            return get_embedding_pb2.EmbeddingsResponse()
 
-def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    get_embedding_pb2_grpc.add_EmbeddingServiceServicer_to_server(
-        EmbeddingServiceServicer(), server
+    def StreamTextEmbeddings(self, request_iterator, context):
+        self._check_ready(context)
+        pending: deque[tuple[int, int, futures.Future]] = deque()
+
+        def pop_response():
+            seq_id, encoding, fut = pending.popleft()
+            try:
+                embedding = fut.result()
+            except Exception as e:
+                context.abort(grpc.StatusCode.INTERNAL, str(e))
+            return get_embedding_pb2.SeqEmbeddingResponse(seq_id=seq_id, embedding=encode_embedding(embedding, encoding))
+
+        for request in request_iterator:
+            pending.append((request.seq_id, request.encoding, self.submit([request.text])[0]))
+            # 先把已完成的结果推回去; 在途过多时阻塞在这里, 不再读取新的请求
+            while pending and (pending[0][2].done() or len(pending) >= STREAM_MAX_INFLIGHT):
+                yield pop_response()
+
+        while pending:
+            yield pop_response()
+
+
+def run_worker(
+    port: int = PORT,
+    cpus: list[int] | None = None,
+    num_threads: int | None = None,
+    worker_id: int = 0,
+    backend: str = "torch",
+    metrics_port: int | None = None,
+):
+    """
+    启动一个服务进程, 收到 SIGINT/SIGTERM 后处理完在途请求再退出。
+    先绑定端口并报告 NOT_SERVING, 再加载模型和预热, 完成后切换为 SERVING。
+    """
+    start = time.perf_counter()
+    if worker_id:
+        logging.basicConfig(level=logging.INFO)
+    # 绑核, 避免多个 worker 抢同一批核
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+    servicer = EmbeddingServiceServicer(backend=backend)
+    # 多个 worker 进程通过 SO_REUSEPORT 监听同一端口, 由内核分发连接
+    server = grpc.server(
+        futures.ThreadPoolExecutor(max_workers=MAX_WORKERS),
+        interceptors=[MetricsInterceptor(servicer.metrics)],
+        options=[("grpc.so_reuseport", 1)],
     )
+    get_embedding_pb2_grpc.add_EmbeddingServiceServicer_to_server(servicer, server)
+    # 标准 grpc.health.v1 健康检查, 预热完成前报告 NOT_SERVING
+    health_servicer = health.HealthServicer()
+    health_pb2_grpc.add_HealthServicer_to_server(health_servicer, server)
+    for name in ("", SERVICE_NAME):
+        health_servicer.set(name, health_pb2.HealthCheckResponse.NOT_SERVING)
 
-    server.add_insecure_port('[::]:50051')
+    server.add_insecure_port(f'[::]:{port}')
     server.start()
-    print("✅ gRPC server started at port 50051...")
-    try:
-        while True:
-            time.sleep(86400)  # 保持运行
-    except KeyboardInterrupt:
-        print("❌ Shutting down server...")
-        server.stop(0)
+    if metrics_port:
+        # 多个 worker 时各自占用 metrics_port + worker_id - 1
+        serve_http(
+            lambda: servicer.metrics.render(servicer.stats(), {"pid": os.getpid(), "backend": backend}),
+            metrics_port + max(worker_id - 1, 0),
+        )
+    servicer.startup["bind"] = time.perf_counter() - start
+    print(f"⏳ port {port} bound, loading model... (worker {worker_id}, pid {os.getpid()})")
+
+    servicer.load(num_threads)
+    servicer.warmup()
+    for name in ("", SERVICE_NAME):
+        health_servicer.set(name, health_pb2.HealthCheckResponse.SERVING)
+    servicer.startup["total"] = time.perf_counter() - start
+    print(
+        f"✅ gRPC server started at port {port}... "
+        f"(worker {worker_id}, pid {os.getpid()}, backend {backend}, cpus {cpus or 'all'})"
+    )
+    print("   startup: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in servicer.startup.items()))
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stopped.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    stopped.wait()
+
+    print(f"❌ Shutting down server... (worker {worker_id})")
+    # 先让健康检查失败, 负载均衡不再分配新请求
+    health_servicer.enter_graceful_shutdown()
+    server.stop(SHUTDOWN_GRACE).wait()
+    servicer.batcher.stop()
+    servicer.cache.close()
+    print(f"embedding stats (worker {worker_id}): {servicer.stats()}")
+
+
+def split_cpus(workers: int) -> list[list[int]]:
+    """把当前可用的核按顺序平均分给各个 worker"""
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+    per_worker = max(1, len(cpus) // workers)
+    return [cpus[i * per_worker % len(cpus):][:per_worker] for i in range(workers)]
+
+
+def serve(
+    port: int = PORT,
+    workers: int = 1,
+    threads_per_worker: int | None = None,
+    pin_cpus: bool = False,
+    backend: str = "torch",
+    metrics_port: int | None = None,
+):
+    if workers <= 1:
+        run_worker(port, num_threads=threads_per_worker, backend=backend, metrics_port=metrics_port)
+        return
+
+    # 每个 worker 各自加载模型; gRPC 不支持 fork, 所以用 spawn 启动
+    cpu_groups = split_cpus(workers)
+    ctx = multiprocessing.get_context("spawn")
+    procs = [
+        ctx.Process(
+            target=run_worker,
+            kwargs=dict(
+                port=port,
+                cpus=cpu_groups[i] if pin_cpus else None,
+                num_threads=threads_per_worker or len(cpu_groups[i]),
+                worker_id=i + 1,
+                backend=backend,
+                metrics_port=metrics_port,
+            ),
+            name=f"embedding-worker-{i + 1}",
+        )
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+
+    def stop_workers(signum, frame):
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+
+    signal.signal(signal.SIGINT, stop_workers)
+    signal.signal(signal.SIGTERM, stop_workers)
+    for p in procs:
+        p.join()
 
 
 if __name__ == '__main__':
-    serve()
+    parser = argparse.ArgumentParser(description="Embedding gRPC server")
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('-w', '--workers', type=int, default=1, help="number of server processes (Linux only when > 1)")
+    parser.add_argument('--threads-per-worker', type=int, default=None, help="torch intra-op threads per worker")
+    parser.add_argument('--pin-cpus', action='store_true', help="pin each worker to its own set of cpus")
+    parser.add_argument('--backend', choices=BACKENDS, default="torch", help="inference backend, see grpc_embedding.backends")
+    parser.add_argument('--metrics-port', type=int, default=None, help="serve Prometheus text at http://:port/metrics")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    serve(args.port, args.workers, args.threads_per_worker, args.pin_cpus, args.backend, args.metrics_port)
@@ -0,0 +1,97 @@
+"""
+不加载模型的替身嵌入服务, 用于在没有模型和 GPU 的机器上压测导入流水线、检索和客户端:
+    python -m grpc_embedding.standin --port 50052 --dim 768 --batch-ms 20 --text-ms 1
+除模型外与正式服务相同(攒批、缓存、in-flight 去重、三种向量格式), 模型换成 HashEmbedding:
+    向量由文本的字二元组特征哈希得到, 同一文本每次都得到同一个向量, 共享字词越多的文本越相似;
+    每次前向计算 sleep batch_ms + text_ms * batch 大小毫秒, 模拟模型耗时。
+"""
+import argparse
+import re
+import time
+import zlib
+from concurrent import futures
+
+import grpc
+import numpy as np
+
+from grpc_embedding import get_embedding_pb2_grpc
+from grpc_embedding.server import MAX_WORKERS, EmbeddingServiceServicer
+
+# 与 text2vec-base-chinese 相同
+DIM = 768
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+class HashEmbedding:
+    def __init__(self, dim: int = DIM, batch_ms: float = 0.0, text_ms: float = 0.0):
+        self.dim = dim
+        self.batch_ms = batch_ms
+        self.text_ms = text_ms
+
+    def embed(self, text: str) -> np.ndarray:
+        chars = _NON_WORD_RE.sub("", text.lower())
+        grams = [chars[i:i + 2] for i in range(len(chars) - 1)] or [chars]
+        hashes = np.array([zlib.crc32(g.encode()) for g in grams], dtype=np.int64)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        # 取模决定落在哪一维, 最高位决定正负号, 哈希冲突的二元组期望上互相抵消, 不会系统性地抬高相似度
+        np.add.at(vector, hashes % self.dim, np.where(hashes >> 31, -1.0, 1.0).astype(np.float32))
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def get_text_embedding_batch(self, texts: list[str]) -> list[list[float]]:
+        delay = self.batch_ms + self.text_ms * len(texts)
+        if delay:
+            time.sleep(delay / 1000)
+        return [self.embed(text).tolist() for text in texts]
+
+
+class StandInServicer(EmbeddingServiceServicer):
+    def __init__(self, dim: int = DIM, batch_ms: float = 0.0, text_ms: float = 0.0, **kwargs):
+        self.dim = dim
+        self.batch_ms = batch_ms
+        self.text_ms = text_ms
+        kwargs.setdefault("cache_db_path", None)
+        super().__init__(backend="standin", **kwargs)
+
+    def load(self, num_threads: int | None = None):
+        start = time.perf_counter()
+        self.embed_model = HashEmbedding(self.dim, self.batch_ms, self.text_ms)
+        self.startup["load"] = time.perf_counter() - start
+
+
+def start_standin(
+    port: int = 0, dim: int = DIM, batch_ms: float = 0.0, text_ms: float = 0.0
+) -> tuple[grpc.Server, int, StandInServicer]:
+    """在当前进程的线程里启动, port 为 0 时随机选一个空闲端口, 返回 (server, 实际端口, servicer)"""
+    servicer = StandInServicer(dim, batch_ms, text_ms)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=MAX_WORKERS))
+    get_embedding_pb2_grpc.add_EmbeddingServiceServicer_to_server(servicer, server)
+    port = server.add_insecure_port(f"localhost:{port}")
+    server.start()
+    servicer.load()
+    servicer.warmup()
+    return server, port, servicer
+
+
+def stop_standin(server: grpc.Server, servicer: StandInServicer):
+    server.stop(None).wait()
+    servicer.batcher.stop()
+    servicer.cache.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in embedding gRPC server with hashed embeddings")
+    parser.add_argument("--port", type=int, default=50052)
+    parser.add_argument("--dim", type=int, default=DIM)
+    parser.add_argument("--batch-ms", type=float, default=0.0, help="simulated model time per forward pass")
+    parser.add_argument("--text-ms", type=float, default=0.0, help="simulated model time per text")
+    args = parser.parse_args()
+
+    server, port, servicer = start_standin(args.port, args.dim, args.batch_ms, args.text_ms)
+    print(f"✅ stand-in embedding server started at port {port} (dim {args.dim})")
+    try:
+        server.wait_for_termination()
+    except KeyboardInterrupt:
+        print("❌ Shutting down stand-in server...")
+        stop_standin(server, servicer)
+        print(f"embedding stats: {servicer.stats()}")
@@ -1,3 +1,4 @@
+import asyncio
 import mimetypes
 from contextlib import asynccontextmanager
 from pathlib import Path
@@ -6,6 +7,8 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.responses import FileResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
 
+from examples.answer_cache import SemanticAnswerCache, with_replayed
+from examples.async_coze_llm import conversation_pool
 from examples.custom_llm import CozeLLM
 from examples.custom_reactagent import (
     StopSignal,
@@ -19,6 +22,7 @@ from examples.custom_workflow import (
     docs_tool,
     # llm,
 )
+from examples.vector_store_index import embed_model, load_grape_index
 
 
 @asynccontextmanager
@@ -28,10 +32,21 @@ async def lifespan(app: FastAPI):
     mimetypes.add_type('application/javascript', '.js')
     mimetypes.add_type('text/css', '.css')
     mimetypes.add_type('image/svg+xml', '.svg')
+    # 预先加载 python -m examples.index_store build 构建好的索引(只是内存映射几个文件), 第一次提问不用等;
+    # 还没有构建时只给出提示, 服务照常启动, 检索工具会返回错误
+    try:
+        await asyncio.to_thread(load_grape_index)
+    except FileNotFoundError as e:
+        print(f"⚠️ {e}")
+    # 后台预先创建几个 Coze 会话, 新连接直接取用
+    conversation_pool.start()
     yield
 
 app = FastAPI(lifespan=lifespan)
 
+# 相似问题直接回放缓存的回答, 不再跑一遍 agent; 与检索共用一个嵌入客户端(连接池和本地缓存)
+answer_cache = SemanticAnswerCache(embed_model)
+
 
 # 挂载静态文件
 app.mount("/assets", StaticFiles(directory="src/frontend/dist/assets"), name="assets")
@@ -49,6 +64,14 @@ def serve_ico():
 def serve_md():
     return FileResponse("src/frontend/dist/grape.md")
 
+@app.get("/api/answer_cache/stats")
+def answer_cache_stats():
+    return answer_cache.stats()
+
+@app.get("/api/conversation_pool/stats")
+def conversation_pool_stats():
+    return conversation_pool.stats()
+
 # 捕获所有未匹配的路由，返回 Vue 的 index.html
 @app.get("/{path:path}", include_in_schema=False)
 async def serve_spa(path: str):
@@ -89,24 +112,41 @@ async def websocket_endpoint(websocket: WebSocket, client_id: int):
         tools=[docs_tool, api_tool, datetime_tool],
         timeout=2 * 60,
     )
+    # 这个会话已经处理过的消息数, 以及由缓存回放、agent 还没见过的轮次
+    turn = 0
+    replayed = []
     try:
         while True:
             data = await websocket.receive_text()
             # await manager.send_personal_message(f"You wrote: {data}", websocket)
             # await manager.broadcast(f"Client #{client_id} says: {data}")
 
-            handler = agent.run(input=data)
+            cached = await answer_cache.lookup(data)
+            if cached is not None:
+                for frame in cached.frames:
+                    await manager.send_personal_message(frame, websocket)
+                replayed.append((data, cached))
+                turn += 1
+                continue
+
+            # 记下发给前端的消息, 回答完成后存入缓存
+            frames: list[str] = []
+            handler = agent.run(input=with_replayed(data, replayed))
+            replayed = []
             async for ev in handler.stream_events():
                 match ev:
                     case StreamEvent():
-                        await manager.send_personal_message(f"0:{ev.delta}", websocket)
+                        frames.append(f"0:{ev.delta}")
                     case ToolCallResultMessage():
-                        await manager.send_personal_message(f"a:{ev.output}", websocket)
+                        frames.append(f"a:{ev.output}")
                     case StopSignal():
-                        await manager.send_personal_message("d:=== end ===", websocket)
+                        frames.append("d:=== end ===")
                     case _:
                         continue
-            await handler
+                await manager.send_personal_message(frames[-1], websocket)
+            result = await handler
+            await answer_cache.store(data, frames, result, turn=turn)
+            turn += 1
     except WebSocketDisconnect:
         manager.disconnect(websocket)
         await manager.broadcast(f"Client #{client_id} left the chat")